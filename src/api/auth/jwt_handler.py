@@ -1,6 +1,10 @@
+import hashlib
 import os
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -9,9 +13,15 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 14
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "30"))
+_TOKEN_CACHE_HASH_KEY = hashlib.blake2b(SECRET_KEY.encode("utf-8"), digest_size=64).digest()
 
 security = HTTPBearer()
 
+_token_cache: TTLCache = TTLCache(maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
 
 def create_access_token(
     data: Dict[str, Any], expires_delta: Optional[timedelta] = None
@@ -37,10 +47,25 @@ def create_refresh_token(data: Dict[str, Any]):
     return encoded_jwt
 
 
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(
+        token.encode("utf-8"), digest_size=16, key=_TOKEN_CACHE_HASH_KEY
+    ).digest()
+
+
 def verify_token(token: str) -> Dict[str, Any]:
+    key = _token_cache_key(token)
+    now = time.time()
+
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None:
+        payload, expires_at = cached
+        if expires_at > now:
+            return dict(payload)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,6 +73,11 @@ def verify_token(token: str) -> Dict[str, Any]:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    expires_at = min(payload.get("exp", now + JWT_CACHE_TTL), now + JWT_CACHE_TTL)
+    with _token_cache_lock:
+        _token_cache[key] = (payload, expires_at)
+    return dict(payload)
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
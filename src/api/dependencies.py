@@ -0,0 +1,12 @@
+from fastapi import Request
+
+from api.services.advisor import FinancialAdvisor
+from db.db_util import SupabaseManager
+
+
+def get_db(request: Request) -> SupabaseManager:
+    return request.app.state.db
+
+
+def get_advisor(request: Request) -> FinancialAdvisor:
+    return request.app.state.advisor
@@ -1,13 +1,18 @@
 import uvicorn
 import logging
 import os
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse
 
+from api.middleware import PreflightMiddleware
 from api.routes.generate import router as generate_router
 from api.routes.user import router as users_router
 from api.routes.holding import router as holding_router
+from api.services.advisor import FinancialAdvisor
+from db.db_util import get_supabase_manager
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -20,20 +25,66 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger(__name__)
+
+CORS_ALLOW_ORIGINS = ["http://localhost:3000"]
+CORS_ALLOW_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+
 logger.info(f"Starting Finance Agent API with log level: {log_level}")
 
-app = FastAPI(title="Finance Agent API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db = get_supabase_manager()
+    app.state.advisor = FinancialAdvisor()
+    await app.state.advisor.warm_up()
+    yield
+    await app.state.advisor.close()
+    await app.state.db.close()
+
+
+app = FastAPI(
+    title="Finance Agent API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
+    allow_origins=CORS_ALLOW_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=CORS_ALLOW_METHODS,
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    PreflightMiddleware,
+    allow_origins=CORS_ALLOW_ORIGINS,
+    allow_methods=CORS_ALLOW_METHODS,
+    allow_credentials=True,
+)
+
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1", "0.0.0.0"])
 
+
+@app.exception_handler(Exception)
+async def handle_unexpected_error(request: Request, exc: Exception) -> ORJSONResponse:
+    logger.exception(f"Unhandled error on {request.method} {request.url.path}: {exc}")
+    response = ORJSONResponse(
+        status_code=500,
+        content={"detail": "Internal server error"},
+    )
+
+    # Exception handlers run in ServerErrorMiddleware, outside CORSMiddleware,
+    # so the CORS headers have to be added here for browsers to see the error
+    origin = request.headers.get("origin")
+    if origin in CORS_ALLOW_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Vary"] = "Origin"
+    return response
+
+
 app.include_router(generate_router)
 app.include_router(users_router)
 app.include_router(holding_router)
@@ -45,4 +96,16 @@ async def read_root():
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        "api.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        # Each worker opens its own Chroma PersistentClient, and Chroma supports a
+        # single writer per persist directory. The advice, user and search caches
+        # are also per process. Only raise WEB_CONCURRENCY for read-only serving.
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        backlog=2048,
+        timeout_keep_alive=30,
+    )
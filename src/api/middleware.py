@@ -0,0 +1,63 @@
+from typing import Iterable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class PreflightMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        allow_origins: Iterable[str],
+        allow_methods: Iterable[str],
+        allow_credentials: bool = False,
+        max_age: int = 600,
+    ):
+        self.app = app
+        self.allow_origins = frozenset(
+            origin.encode("latin-1") for origin in allow_origins
+        )
+        self.allow_methods = frozenset(
+            method.encode("latin-1") for method in allow_methods
+        )
+
+        self._static_headers = [
+            (
+                b"access-control-allow-methods",
+                b", ".join(sorted(self.allow_methods)),
+            ),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            (b"vary", b"Origin"),
+        ]
+        if allow_credentials:
+            self._static_headers.append((b"access-control-allow-credentials", b"true"))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        origin = headers.get(b"origin")
+        request_method = headers.get(b"access-control-request-method")
+
+        if (
+            origin not in self.allow_origins
+            or request_method not in self.allow_methods
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        response_headers = [
+            (b"access-control-allow-origin", origin),
+            *self._static_headers,
+        ]
+        requested_headers = headers.get(b"access-control-request-headers")
+        if requested_headers:
+            response_headers.append(
+                (b"access-control-allow-headers", requested_headers)
+            )
+
+        await send(
+            {"type": "http.response.start", "status": 204, "headers": response_headers}
+        )
+        await send({"type": "http.response.body", "body": b""})
@@ -1,8 +1,32 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict
+import re
+import msgspec
+from pydantic import AfterValidator, BaseModel, ConfigDict, EmailStr, StringConstraints
+from typing import Annotated, Optional, List, Dict
 
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 
-class AdviceRequest(BaseModel):
+
+def _validate_email(value: str) -> str:
+    if not _EMAIL_RE.match(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
+
+Username = Annotated[str, StringConstraints(max_length=64)]
+StockSymbol = Annotated[str, StringConstraints(max_length=16)]
+Email = Annotated[str, AfterValidator(_validate_email)]
+
+
+class RequestModel(BaseModel):
+    model_config = ConfigDict(
+        extra="ignore",
+        frozen=True,
+        validate_assignment=False,
+        str_strip_whitespace=False,
+    )
+
+
+class AdviceRequest(RequestModel):
     user_id: int
 
 
@@ -11,8 +35,8 @@ class AdviceResponse(BaseModel):
     relevant_documents: Optional[List[Dict[str, str]]] = None
 
 
-class UserCreateRequest(BaseModel):
-    username: str
+class UserCreateRequest(RequestModel):
+    username: Username
     email: EmailStr
     password: str
 
@@ -24,8 +48,8 @@ class UserResponse(BaseModel):
     created_at: str
 
 
-class UserSignInRequest(BaseModel):
-    username: str
+class UserSignInRequest(RequestModel):
+    username: Username
     password: str
 
 
@@ -36,14 +60,14 @@ class UserSignInResponse(BaseModel):
     token_type: str
 
 
-class UserUpdateRequest(BaseModel):
-    username: Optional[str] = None
-    email: Optional[EmailStr] = None
+class UserUpdateRequest(RequestModel):
+    username: Optional[Username] = None
+    email: Optional[Email] = None
     password: Optional[str] = None
 
 
-class HoldingCreateRequest(BaseModel):
-    stock: str
+class HoldingCreateRequest(RequestModel):
+    stock: StockSymbol
 
 
 class HoldingResponse(BaseModel):
@@ -51,5 +75,14 @@ class HoldingResponse(BaseModel):
     stock: str
 
 
-class HoldingDeleteRequest(BaseModel):
+class HoldingRecord(msgspec.Struct, frozen=True):
+    user_id: int
     stock: str
+
+
+class HoldingDeleteRequest(RequestModel):
+    stock: StockSymbol
+
+
+class HoldingBulkRequest(RequestModel):
+    stocks: List[StockSymbol]
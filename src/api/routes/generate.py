@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 
-from api.models.schema import AdviceResponse
+from api.models.schema import AdviceRequest, AdviceResponse
 from api.auth.jwt_handler import get_current_user
-from api.services.advisor import generate_advice
+from api.dependencies import get_advisor
+from api.services.advisor import FinancialAdvisor, generate_advice, stream_advice
 
 router = APIRouter()
 
 
 @router.post("/generate_advice", response_model=AdviceResponse)
-async def get_advice(current_user: dict = Depends(get_current_user)) -> AdviceResponse:
-    # Create a mock request with user_id from JWT token
-    from api.models.schema import AdviceRequest
-
+async def get_advice(
+    stream: bool = Query(False),
+    current_user: dict = Depends(get_current_user),
+    advisor: FinancialAdvisor = Depends(get_advisor),
+):
     request = AdviceRequest(user_id=current_user["user_id"])
-    return await generate_advice(request)
+
+    if stream:
+        return StreamingResponse(
+            stream_advice(request, advisor), media_type="application/x-ndjson"
+        )
+
+    return await generate_advice(request, advisor)
@@ -1,75 +1,110 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import msgspec
+import orjson
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query, Response, status, Depends
+from fastapi.responses import StreamingResponse
 
 from api.models.schema import (
     HoldingCreateRequest,
     HoldingResponse,
     HoldingDeleteRequest,
+    HoldingBulkRequest,
+    HoldingRecord,
 )
 from api.auth.jwt_handler import get_current_user
+from api.dependencies import get_db
 from db.db_util import SupabaseManager
 
 router = APIRouter(prefix="/holding", tags=["holding"])
 
+_json_encoder = msgspec.json.Encoder()
+
 
 @router.post("/", response_model=HoldingResponse, status_code=status.HTTP_201_CREATED)
 async def create_holding(
-    holding_data: HoldingCreateRequest, current_user: dict = Depends(get_current_user)
+    holding_data: HoldingCreateRequest,
+    current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
 ):
-    try:
-        manager = SupabaseManager()
-        holding = await manager.create_holding(
-            user_id=current_user["user_id"], stock=holding_data.stock
-        )
+    holding = await manager.create_holding(
+        user_id=current_user["user_id"], stock=holding_data.stock
+    )
 
-        return HoldingResponse(user_id=holding["user_id"], stock=holding["stock"])
+    return HoldingResponse.model_construct(
+        user_id=holding["user_id"], stock=holding["stock"]
+    )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create holding: {str(e)}",
-        )
+
+@router.post(
+    "/bulk", response_model=list[HoldingResponse], status_code=status.HTTP_201_CREATED
+)
+async def create_holdings(
+    holding_data: HoldingBulkRequest,
+    current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
+):
+    holdings = await manager.create_holdings(
+        user_id=current_user["user_id"], stocks=holding_data.stocks
+    )
+
+    records = [
+        HoldingRecord(user_id=holding["user_id"], stock=holding["stock"])
+        for holding in holdings
+    ]
+    return Response(
+        content=_json_encoder.encode(records),
+        media_type="application/json",
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+@router.delete("/bulk", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_holdings(
+    holding_data: HoldingBulkRequest,
+    current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
+):
+    await manager.delete_holdings(user_id=current_user["user_id"], stocks=holding_data.stocks)
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_holding(
-    holding_data: HoldingDeleteRequest, current_user: dict = Depends(get_current_user)
+    holding_data: HoldingDeleteRequest,
+    current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
 ):
-    try:
-        manager = SupabaseManager()
-        success = await manager.delete_holding_by_user_and_stock(
-            user_id=current_user["user_id"], stock=holding_data.stock
-        )
+    success = await manager.delete_holding_by_user_and_stock(
+        user_id=current_user["user_id"], stock=holding_data.stock
+    )
 
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to delete holding",
-            )
-
-    except HTTPException:
-        raise
-    except Exception as e:
+    if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete holding: {str(e)}",
+            detail="Failed to delete holding",
         )
 
 
 @router.get("/", response_model=list[HoldingResponse])
-async def get_user_holdings(current_user: dict = Depends(get_current_user)):
-    try:
-        manager = SupabaseManager()
-        holdings = await manager.get_holdings_by_user(current_user["user_id"])
+async def get_user_holdings(
+    format: Literal["json", "ndjson"] = Query("json"),
+    current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
+):
+    if format == "ndjson":
+        holdings_stream = manager.iter_holdings_by_user(current_user["user_id"])
+        return StreamingResponse(
+            (
+                orjson.dumps({"user_id": holding["user_id"], "stock": holding["stock"]})
+                + b"\n"
+                async for holding in holdings_stream
+            ),
+            media_type="application/x-ndjson",
+        )
 
-        return [
-            HoldingResponse(user_id=holding["user_id"], stock=holding["stock"])
-            for holding in holdings
-        ]
+    holdings = await manager.get_holdings_by_user(current_user["user_id"])
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to retrieve holdings: {str(e)}",
-        )
+    records = [
+        HoldingRecord(user_id=holding["user_id"], stock=holding["stock"])
+        for holding in holdings
+    ]
+    return Response(content=_json_encoder.encode(records), media_type="application/json")
@@ -12,191 +12,144 @@ from api.auth.jwt_handler import (
     create_access_token,
     create_refresh_token,
 )
+from api.dependencies import get_db
 from db.db_util import SupabaseManager
 
 router = APIRouter(prefix="/user", tags=["user"])
 
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(user_data: UserCreateRequest):
-    try:
-        manager = SupabaseManager()
-
-        existing_user = await manager.get_user_by_email(user_data.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="User with this email already exists",
-            )
-
-        existing_user = await manager.get_user_by_username(user_data.username)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="User with this username already exists",
-            )
-
-        user = await manager.create_user(
-            username=user_data.username,
-            email=user_data.email,
-            password=user_data.password,
-        )
-
-        return UserResponse(
-            id=user["id"],
-            username=user["username"],
-            email=user["email"],
-            created_at=user["created_at"],
+async def create_user(
+    user_data: UserCreateRequest,
+    manager: SupabaseManager = Depends(get_db),
+):
+    existing_users = await manager.get_users_by_email_or_username(
+        user_data.email, user_data.username
+    )
+    if any(user["email"] == user_data.email for user in existing_users):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="User with this email already exists",
         )
 
-    except HTTPException:
-        raise
-    except Exception as e:
+    if existing_users:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create user: {str(e)}",
+            status_code=status.HTTP_409_CONFLICT,
+            detail="User with this username already exists",
         )
 
+    user = await manager.create_user(
+        username=user_data.username,
+        email=user_data.email,
+        password=user_data.password,
+    )
 
-@router.post("/signin", response_model=UserSignInResponse)
-async def sign_in(signin_data: UserSignInRequest):
-    try:
-        manager = SupabaseManager()
+    return UserResponse.model_construct(
+        id=user["id"],
+        username=user["username"],
+        email=user["email"],
+        created_at=user["created_at"],
+    )
 
-        user = await manager.verify_user_credentials(
-            signin_data.username, signin_data.password
-        )
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid username or password",
-            )
-
-        token_data = {"user_id": user["id"], "username": user["username"]}
-        access_token = create_access_token(data=token_data)
-        refresh_token = create_refresh_token(data=token_data)
-
-        return UserSignInResponse(
-            user=UserResponse(
-                id=user["id"],
-                username=user["username"],
-                email=user["email"],
-                created_at=user["created_at"],
-            ),
-            access_token=access_token,
-            refresh_token=refresh_token,
-            token_type="bearer",
-        )
 
-    except HTTPException:
-        raise
-    except Exception as e:
+@router.post("/signin", response_model=UserSignInResponse)
+async def sign_in(
+    signin_data: UserSignInRequest,
+    manager: SupabaseManager = Depends(get_db),
+):
+    user = await manager.verify_user_credentials(
+        signin_data.username, signin_data.password
+    )
+    if not user:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to sign in: {str(e)}",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid username or password",
         )
 
+    token_data = {"user_id": user["id"], "username": user["username"]}
+    access_token = create_access_token(data=token_data)
+    refresh_token = create_refresh_token(data=token_data)
 
-@router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: str, current_user: dict = Depends(get_current_user)):
-    try:
-        manager = SupabaseManager()
-
-        user = await manager.get_user_by_id(user_id)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-            )
-
-        return UserResponse(
+    return UserSignInResponse.model_construct(
+        user=UserResponse.model_construct(
             id=user["id"],
             username=user["username"],
             email=user["email"],
             created_at=user["created_at"],
-        )
+        ),
+        access_token=access_token,
+        refresh_token=refresh_token,
+        token_type="bearer",
+    )
 
-    except HTTPException:
-        raise
-    except Exception as e:
+
+@router.get("/{user_id}", response_model=UserResponse)
+async def get_user(
+    user_id: int,
+    current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
+):
+    user = await manager.get_user_by_id(user_id)
+    if not user:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to retrieve user: {str(e)}",
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
+    return UserResponse.model_construct(
+        id=user["id"],
+        username=user["username"],
+        email=user["email"],
+        created_at=user["created_at"],
+    )
+
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
-    user_id: str,
+    user_id: int,
     user_data: UserUpdateRequest,
     current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
 ):
-    try:
-        if current_user["user_id"] != int(user_id):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You can only update your own profile",
-            )
-
-        manager = SupabaseManager()
-
-        existing_user = await manager.get_user_by_id(user_id)
-        if not existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-            )
-
-        updated_user = await manager.update_user(
-            user_id=user_id,
-            username=user_data.username,
-            email=user_data.email,
-            password=user_data.password,
+    if current_user["user_id"] != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only update your own profile",
         )
 
-        return UserResponse(
-            id=updated_user["id"],
-            username=updated_user["username"],
-            email=updated_user["email"],
-            created_at=updated_user["created_at"],
+    updated_user = await manager.update_user(
+        user_id=user_id,
+        username=user_data.username,
+        email=user_data.email,
+        password=user_data.password,
+    )
+    if not updated_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    except HTTPException:
-        raise
-    except Exception as e:
+    return UserResponse.model_construct(
+        id=updated_user["id"],
+        username=updated_user["username"],
+        email=updated_user["email"],
+        created_at=updated_user["created_at"],
+    )
+
+
+@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_user(
+    user_id: int,
+    current_user: dict = Depends(get_current_user),
+    manager: SupabaseManager = Depends(get_db),
+):
+    if current_user["user_id"] != user_id:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update user: {str(e)}",
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only delete your own profile",
         )
 
+    success = await manager.delete_user(user_id)
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(user_id: str, current_user: dict = Depends(get_current_user)):
-    try:
-        if current_user["user_id"] != int(user_id):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You can only delete your own profile",
-            )
-
-        manager = SupabaseManager()
-
-        existing_user = await manager.get_user_by_id(user_id)
-        if not existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-            )
-
-        success = await manager.delete_user(user_id)
-
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to delete user",
-            )
-
-    except HTTPException:
-        raise
-    except Exception as e:
+    if not success:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete user: {str(e)}",
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
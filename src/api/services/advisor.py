@@ -1,31 +1,139 @@
+import asyncio
+import hashlib
 import os
 import logging
 import time
-from typing import List, Dict, Any
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import AsyncIterator, List, Dict, Any, Optional
+import httpx
+import orjson
+from cachetools import TTLCache
+from openai import AsyncOpenAI
 
 from api.models.schema import AdviceRequest, AdviceResponse
-from db.db_util import get_user_holdings, get_stock_metadata
+from db.db_util import get_user_holdings, get_stock_metadata_bulk
 from retriever.vector_store import get_vector_store
 from retriever.config import VECTOR_STORE_CONFIG
 from langchain_core.documents import Document
 from tracking.advisor_tracker import AdvisorTracker
 from api.services.config import (
     SYSTEM_PROMPT,
+    ADVICE_PROMPT_TEMPLATE,
     ERROR_ADVICE,
+    GENERATION_ERROR_ADVICE,
+    GENERIC_ADVICE,
+    GENERAL_MARKET_QUERIES,
+    GENERAL_MARKET_CONTEXT_TTL,
     MODEL_NAME,
     RETRIEVER_K,
     RELEVANT_DOCUMENTS_TOP_K,
+    MAX_RELEVANT_DISTANCE,
     MAX_TOKENS,
+    ADVICE_BASE_OUTPUT_TOKENS,
+    ADVICE_OUTPUT_TOKENS_PER_DOCUMENT,
+    MAX_CONCURRENT_LLM_REQUESTS,
+    OPENAI_TIMEOUT,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    SEARCH_POOL_SIZE,
+    ADVICE_CACHE_SIZE,
+    ADVICE_CACHE_TTL,
 )
 
 logger = logging.getLogger(__name__)
 
 
+_llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_REQUESTS)
+
+
+def _max_output_tokens(relevant_documents: List[tuple[Document, float]]) -> int:
+    # The base budget leaves room for reasoning tokens, which gpt-5 models
+    # count against max_output_tokens
+    return min(
+        MAX_TOKENS,
+        ADVICE_BASE_OUTPUT_TOKENS + ADVICE_OUTPUT_TOKENS_PER_DOCUMENT * len(relevant_documents),
+    )
+
+
+def _top_unique_documents(
+    documents: List[tuple[Document, float]],
+) -> List[tuple[Document, float]]:
+    seen = set()
+    unique_docs = []
+    for doc, score in documents:
+        content_hash = hashlib.blake2b(doc.page_content.encode("utf-8"), digest_size=16).digest()
+        if content_hash not in seen:
+            seen.add(content_hash)
+            unique_docs.append((doc, score))
+
+    # Scores are L2 distances, so the nearest documents sort first
+    unique_docs.sort(key=lambda item: item[1])
+    return unique_docs[:RELEVANT_DOCUMENTS_TOP_K]
+
+
+@lru_cache(maxsize=8192)
+def _enhanced_search_query(
+    stock: str,
+    company_name: Optional[str],
+    short_name: Optional[str],
+    industries: Optional[str],
+    description: Optional[str],
+) -> str:
+    query_parts = [stock]
+
+    if company_name:
+        query_parts.append(company_name)
+
+    if short_name:
+        query_parts.append(short_name)
+
+    if industries:
+        for industry in industries.split(","):
+            industry = industry.strip()
+            if industry:
+                query_parts.append(industry)
+
+    if description:
+        desc_words = description.split(maxsplit=30)[:30]
+        query_parts.append(" ".join(desc_words))
+
+    query_parts.extend(
+        [
+            "financial analysis",
+            "market trends",
+            "investment",
+            "stock analysis",
+            "earnings",
+            "revenue",
+            "growth",
+            "performance",
+        ]
+    )
+
+    return " ".join(query_parts)
+
+
 class FinancialAdvisor:
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(
+                http2=True,
+                timeout=OPENAI_TIMEOUT,
+                limits=httpx.Limits(
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                ),
+            ),
+        )
         self.vector_store = get_vector_store(VECTOR_STORE_CONFIG)
+        self._search_pool = ThreadPoolExecutor(
+            max_workers=SEARCH_POOL_SIZE, thread_name_prefix="vector-search"
+        )
+        self._general_market_docs: Optional[List[tuple[Document, float]]] = None
+        self._general_market_expires_at = 0.0
+        self._general_market_lock = asyncio.Lock()
 
         try:
             self.tracker = AdvisorTracker()
@@ -33,47 +141,41 @@ class FinancialAdvisor:
             logger.error(f"Error initializing advisor tracker: {e}")
             pass
 
-    def _build_enhanced_search_query(self, stock: str, metadata: Dict[str, Any] = None) -> str:
-        query_parts = [stock]
-
-        if metadata:
-            if metadata.get("company_name"):
-                query_parts.append(metadata["company_name"])
-
-            if metadata.get("short_name"):
-                query_parts.append(metadata["short_name"])
-
-            if metadata.get("industries"):
-                industries = metadata["industries"].split(",")
-                for industry in industries:
-                    industry = industry.strip()
-                    if industry:
-                        query_parts.append(industry)
-
-            if metadata.get("description"):
-                desc_words = metadata["description"].split()[:30]
-                query_parts.append(" ".join(desc_words))
-
-        query_parts.extend(
-            [
-                "financial analysis",
-                "market trends",
-                "investment",
-                "stock analysis",
-                "earnings",
-                "revenue",
-                "growth",
-                "performance",
-            ]
+    async def _run_search(self, search_fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._search_pool, partial(search_fn, *args, **kwargs)
         )
 
-        final_query = " ".join(query_parts)
-        return final_query
+    async def warm_up(self) -> None:
+        try:
+            await self._run_search(self.vector_store.warm_up)
+        except Exception as e:
+            logger.warning(f"Embedder warm-up failed: {e}")
+
+        try:
+            await self.openai_client.models.list()
+        except Exception as e:
+            logger.warning(f"OpenAI client warm-up failed: {e}")
+
+    async def close(self) -> None:
+        self._search_pool.shutdown(wait=False, cancel_futures=True)
+        await self.openai_client.close()
+
+    def _build_enhanced_search_query(self, stock: str, metadata: Dict[str, Any] = None) -> str:
+        metadata = metadata or {}
+        return _enhanced_search_query(
+            stock,
+            metadata.get("company_name"),
+            metadata.get("short_name"),
+            metadata.get("industries"),
+            metadata.get("description"),
+        )
 
     async def get_user_portfolio_context(
         self, user_id: int
     ) -> tuple[List[Dict[str, Any]], List[tuple[Document, float]]]:
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         try:
             if self.tracker and self.tracker.client:
@@ -100,32 +202,54 @@ class FinancialAdvisor:
 
             stock_symbols = [holding.get("stock", "") for holding in holdings]
 
-            relevant_documents = []
-            for stock in stock_symbols:
-                try:
-                    stock_metadata = await get_stock_metadata(stock)
-                    enhanced_query = self._build_enhanced_search_query(stock, stock_metadata)
-                except Exception:
-                    enhanced_query = self._build_enhanced_search_query(stock, None)
+            try:
+                stock_metadata = await get_stock_metadata_bulk(stock_symbols)
+            except Exception as metadata_error:
+                logger.warning(f"Error fetching stock metadata: {metadata_error}")
+                stock_metadata = {}
+
+            enhanced_queries = [
+                self._build_enhanced_search_query(stock, stock_metadata.get(stock))
+                for stock in stock_symbols
+            ]
 
-                search_start_time = time.time()
+            # Repeated queries are served by the retriever's query cache
+            search_start_time = time.perf_counter()
+            batch_results = await self._run_search(
+                self.vector_store.search_batch, enhanced_queries, RETRIEVER_K
+            )
+            search_time = time.perf_counter() - search_start_time
 
-                search_results = self.vector_store.search(query=enhanced_query, top_k=RETRIEVER_K)
-                search_time = time.time() - search_start_time
+            logger.info(
+                f"Batched search for {len(stock_symbols)} stocks took {search_time:.3f}s"
+            )
 
-                logger.info(
-                    f"Search for {stock} took {search_time:.3f}s, found {len(search_results)} results"
+            if self.tracker and self.tracker.client:
+                self.tracker.log_vector_store_search_batch(
+                    {
+                        stock: (query, search_results, search_time)
+                        for stock, query, search_results in zip(
+                            stock_symbols, enhanced_queries, batch_results
+                        )
+                    }
                 )
 
+            log_per_stock = logger.isEnabledFor(logging.INFO)
+            relevant_documents = []
+            for stock, search_results in zip(stock_symbols, batch_results):
+                if log_per_stock:
+                    logger.info(f"Found {len(search_results)} results for {stock}")
                 for doc, score in search_results:
-                    if score > 0.7:
+                    if score <= MAX_RELEVANT_DISTANCE:
                         relevant_documents.append((doc, score))
 
+            relevant_documents = _top_unique_documents(relevant_documents)
+
             if not relevant_documents:
                 logger.info("No stock-specific documents found, using general market context")
                 relevant_documents = await self._get_general_market_context()
 
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
 
             if self.tracker and self.tracker.client:
                 self.tracker.log_portfolio_context(
@@ -138,7 +262,7 @@ class FinancialAdvisor:
             return holdings, relevant_documents
 
         except Exception as e:
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
             logger.error(f"Error in get_user_portfolio_context: {e}")
 
             try:
@@ -149,92 +273,108 @@ class FinancialAdvisor:
                     f"Error logging error in portfolio context generation: {tracker_error}"
                 )
 
-            relevant_documents = await self._get_general_market_context()
-            return [], relevant_documents
+            # Let callers report the failure instead of treating it as an
+            # empty portfolio and returning generic advice
+            raise
 
     async def _get_general_market_context(self) -> List[tuple[Document, float]]:
+        if self._general_market_docs is not None and self._general_market_expires_at > time.perf_counter():
+            return list(self._general_market_docs)
+
+        async with self._general_market_lock:
+            if (
+                self._general_market_docs is None
+                or self._general_market_expires_at <= time.perf_counter()
+            ):
+                relevant_documents = await self._compute_general_market_context()
+                if relevant_documents is None:
+                    return []
+                self._general_market_docs = relevant_documents
+                self._general_market_expires_at = time.perf_counter() + GENERAL_MARKET_CONTEXT_TTL
+
+            return list(self._general_market_docs)
+
+    async def _compute_general_market_context(self) -> Optional[List[tuple[Document, float]]]:
         try:
-            general_queries = [
-                "financial analysis market trends investment",
-                "portfolio diversification investment strategy",
-                "market analysis economic outlook",
-                "investment advice financial planning",
-            ]
+            general_queries = GENERAL_MARKET_QUERIES
+
+            search_results = await asyncio.gather(
+                *(
+                    self._run_search(self.vector_store.search, query=query, top_k=2)
+                    for query in general_queries
+                ),
+                return_exceptions=True,
+            )
 
             relevant_documents = []
-            for query in general_queries:
-                try:
-                    search_results = self.vector_store.search(query=query, top_k=2)
-
-                    for doc, score in search_results:
-                        if score > 0.7:
-                            relevant_documents.append((doc, score))
-
-                except Exception as e:
-                    logger.warning(f"Error searching for general context with query '{query}': {e}")
+            for query, results in zip(general_queries, search_results):
+                if isinstance(results, Exception):
+                    logger.warning(
+                        f"Error searching for general context with query '{query}': {results}"
+                    )
                     continue
 
-            seen_contents = set()
-            unique_docs = []
-            for doc, score in relevant_documents:
-                if doc.page_content not in seen_contents:
-                    seen_contents.add(doc.page_content)
-                    unique_docs.append((doc, score))
+                for doc, score in results:
+                    if score <= MAX_RELEVANT_DISTANCE:
+                        relevant_documents.append((doc, score))
 
-            return unique_docs[:RELEVANT_DOCUMENTS_TOP_K]
+            return _top_unique_documents(relevant_documents)
 
         except Exception as e:
             logger.error(f"Error getting general market context: {e}")
-            return []
+            return None
 
-    async def generate_financial_advice(
+    def _build_advice_prompt(
         self, holdings: List[Dict[str, Any]], relevant_documents: List[tuple[Document, float]]
     ) -> tuple[str, List[Dict[str, str]]]:
-        start_time = time.time()
+        portfolio_summary = self._format_portfolio_summary(holdings)
 
-        try:
-            portfolio_summary = self._format_portfolio_summary(holdings)
-
-            market_context_parts = []
-            relevant_docs_with_urls = []
+        market_context_parts = []
+        relevant_docs_with_urls = []
 
-            for doc, score in relevant_documents[:RELEVANT_DOCUMENTS_TOP_K]:
-                market_context_parts.append(doc.page_content)
+        for doc, score in relevant_documents[:RELEVANT_DOCUMENTS_TOP_K]:
+            market_context_parts.append(doc.page_content)
 
-                url = doc.metadata.get("source", "No URL available")
-                relevant_docs_with_urls.append(
-                    {
-                        "content": (
-                            doc.page_content[:200] + "..."
-                            if len(doc.page_content) > 200
-                            else doc.page_content
-                        ),
-                        "url": url,
-                        "score": f"{score:.3f}",
-                    }
-                )
-
-            market_context = "\n".join(market_context_parts)
-
-            user_prompt = f"""{SYSTEM_PROMPT}
+            url = doc.metadata.get("source", "No URL available")
+            relevant_docs_with_urls.append(
+                {
+                    "content": (
+                        doc.page_content[:200] + "..."
+                        if len(doc.page_content) > 200
+                        else doc.page_content
+                    ),
+                    "url": url,
+                    "score": f"{score:.3f}",
+                }
+            )
 
-Current Portfolio:
-{portfolio_summary}
+        market_context = "\n".join(market_context_parts)
 
-Relevant Reddit Posts:
-{market_context}
+        user_prompt = ADVICE_PROMPT_TEMPLATE.format(
+            portfolio_summary=portfolio_summary, market_context=market_context
+        )
+        return user_prompt, relevant_docs_with_urls
 
-Please provide comprehensive financial advice based on the above information.
-"""
+    async def generate_financial_advice(
+        self, holdings: List[Dict[str, Any]], relevant_documents: List[tuple[Document, float]]
+    ) -> tuple[str, List[Dict[str, str]]]:
+        start_time = time.perf_counter()
 
-            response = self.openai_client.responses.create(
-                model=MODEL_NAME,
-                input=user_prompt,
-                max_output_tokens=MAX_TOKENS,
+        try:
+            user_prompt, relevant_docs_with_urls = self._build_advice_prompt(
+                holdings, relevant_documents
             )
 
+            async with _llm_semaphore:
+                response = await self.openai_client.responses.create(
+                    model=MODEL_NAME,
+                    instructions=SYSTEM_PROMPT,
+                    input=user_prompt,
+                    max_output_tokens=_max_output_tokens(relevant_documents),
+                )
+
             advice_response = response.output_text
-            generation_time = time.time() - start_time
+            generation_time = time.perf_counter() - start_time
 
             if self.tracker and self.tracker.client:
                 self.tracker.log_advice_generation(
@@ -251,9 +391,9 @@ Please provide comprehensive financial advice based on the above information.
             return advice_response, relevant_docs_with_urls
 
         except Exception as e:
-            generation_time = time.time() - start_time
+            generation_time = time.perf_counter() - start_time
 
-            error_response = "I apologize, but I'm currently unable to generate personalized advice\n\nHowever, I can suggest some general principles: diversify your portfolio, consider your risk tolerance, and regularly review your investment strategy."
+            error_response = GENERATION_ERROR_ADVICE
 
             try:
                 if self.tracker and self.tracker.client:
@@ -272,40 +412,117 @@ Please provide comprehensive financial advice based on the above information.
 
             return error_response, []
 
+    async def stream_financial_advice(
+        self,
+        user_prompt: str,
+        advice_parts: List[str],
+        max_output_tokens: int = MAX_TOKENS,
+        stream_status: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        # stream_status["completed"] is only set once the model reports
+        # response.completed; stream_status["error"] is set on failure.
+        if stream_status is None:
+            stream_status = {}
+        stream_status["completed"] = False
+        start_time = time.perf_counter()
+        token_count = None
+
+        try:
+            async with _llm_semaphore:
+                stream = await self.openai_client.responses.create(
+                    model=MODEL_NAME,
+                    instructions=SYSTEM_PROMPT,
+                    input=user_prompt,
+                    max_output_tokens=max_output_tokens,
+                    stream=True,
+                )
+
+                async for event in stream:
+                    if event.type == "response.output_text.delta":
+                        advice_parts.append(event.delta)
+                        yield event.delta
+                    elif event.type == "response.completed":
+                        stream_status["completed"] = True
+                        if event.response.usage:
+                            token_count = getattr(
+                                event.response.usage, "total_tokens", None
+                            )
+
+        except Exception as e:
+            logger.error(f"Error streaming financial advice: {e}")
+            stream_status["error"] = str(e)
+            try:
+                if self.tracker and self.tracker.client:
+                    self.tracker.log_error(e, "advice_streaming")
+            except Exception as tracker_error:
+                logger.error(f"Error logging error in advice streaming: {tracker_error}")
+            if not advice_parts:
+                advice_parts.append(GENERATION_ERROR_ADVICE)
+                yield GENERATION_ERROR_ADVICE
+            return
+
+        if stream_status["completed"] and self.tracker and self.tracker.client:
+            self.tracker.log_advice_generation(
+                user_prompt=user_prompt,
+                advice_response="".join(advice_parts),
+                generation_time=time.perf_counter() - start_time,
+                token_count=token_count,
+            )
+
     def _format_portfolio_summary(self, holdings: List[Dict[str, Any]]) -> str:
         if not holdings:
             return "No current holdings found."
 
-        summary = "Current Holdings:\n"
-        for i, holding in enumerate(holdings, 1):
-            stock = holding.get("stock", "Unknown")
-            summary += f"{i}. {stock}\n"
-
-        summary += f"\nTotal Holdings: {len(holdings)} stocks"
-        return summary
+        lines = ["Current Holdings:"]
+        lines.extend(
+            f"{i}. {holding.get('stock', 'Unknown')}" for i, holding in enumerate(holdings, 1)
+        )
+        lines.append(f"\nTotal Holdings: {len(holdings)} stocks")
+        return "\n".join(lines)
 
 
-_advisor_instance = None
+_advice_cache: TTLCache = TTLCache(maxsize=ADVICE_CACHE_SIZE, ttl=ADVICE_CACHE_TTL)
+_advice_cache_lock = asyncio.Lock()
 
 
-def get_advisor() -> FinancialAdvisor:
-    global _advisor_instance
-    if _advisor_instance is None:
-        _advisor_instance = FinancialAdvisor()
-    return _advisor_instance
+def _advice_cache_key(
+    user_id: int,
+    holdings: List[Dict[str, Any]],
+    relevant_documents: List[tuple[Document, float]],
+) -> tuple[int, bytes]:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{MODEL_NAME}\0{MAX_TOKENS}\0".encode("utf-8"))
+    stocks = ",".join(sorted(holding.get("stock", "") for holding in holdings))
+    digest.update(stocks.encode("utf-8"))
+    for content in sorted(doc.page_content for doc, _ in relevant_documents):
+        digest.update(b"\0")
+        digest.update(content.encode("utf-8"))
+    return user_id, digest.digest()
 
 
-async def generate_advice(request: AdviceRequest) -> AdviceResponse:
+async def generate_advice(request: AdviceRequest, advisor: FinancialAdvisor) -> AdviceResponse:
     try:
         logger.info(f"Starting advice generation for user {request.user_id}")
 
-        advisor = get_advisor()
         holdings, relevant_documents = await advisor.get_user_portfolio_context(request.user_id)
 
         logger.info(
             f"Retrieved {len(holdings)} holdings and {len(relevant_documents)} relevant documents for user {request.user_id}"
         )
 
+        if not holdings and not relevant_documents:
+            logger.info(
+                f"No holdings or market context for user {request.user_id}, returning generic advice"
+            )
+            return AdviceResponse(advice=GENERIC_ADVICE, relevant_documents=[])
+
+        cache_key = _advice_cache_key(request.user_id, holdings, relevant_documents)
+        async with _advice_cache_lock:
+            cached_response = _advice_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info(f"Returning cached advice for user {request.user_id}")
+            return cached_response
+
         if not relevant_documents:
             logger.warning(
                 f"No relevant documents found for user {request.user_id}, advice may be generic"
@@ -315,17 +532,73 @@ async def generate_advice(request: AdviceRequest) -> AdviceResponse:
             holdings, relevant_documents
         )
 
+        response = AdviceResponse(advice=advice, relevant_documents=relevant_docs)
+        if advice != GENERATION_ERROR_ADVICE:
+            async with _advice_cache_lock:
+                _advice_cache[cache_key] = response
+
         logger.info(f"Successfully generated advice for user {request.user_id}")
-        return AdviceResponse(advice=advice, relevant_documents=relevant_docs)
+        return response
 
     except Exception as e:
         logger.error(f"Error generating advice for user {request.user_id}: {e}")
 
         try:
-            advisor = get_advisor()
             if advisor.tracker and advisor.tracker.client:
                 advisor.tracker.log_error(e, "main_advice_generation", request.user_id)
         except Exception as tracker_error:
             logger.error(f"Error logging error in main advice generation: {tracker_error}")
 
         return AdviceResponse(advice=ERROR_ADVICE, relevant_documents=[])
+
+
+async def stream_advice(request: AdviceRequest, advisor: FinancialAdvisor) -> AsyncIterator[bytes]:
+    logger.info(f"Starting streamed advice generation for user {request.user_id}")
+
+    try:
+        holdings, relevant_documents = await advisor.get_user_portfolio_context(
+            request.user_id
+        )
+    except Exception as e:
+        logger.error(f"Error streaming advice for user {request.user_id}: {e}")
+        yield orjson.dumps({"relevant_documents": []}) + b"\n"
+        yield orjson.dumps({"delta": ERROR_ADVICE}) + b"\n"
+        return
+
+    if not holdings and not relevant_documents:
+        yield orjson.dumps({"relevant_documents": []}) + b"\n"
+        yield orjson.dumps({"delta": GENERIC_ADVICE}) + b"\n"
+        return
+
+    cache_key = _advice_cache_key(request.user_id, holdings, relevant_documents)
+    async with _advice_cache_lock:
+        cached_response = _advice_cache.get(cache_key)
+    if cached_response is not None:
+        logger.info(f"Returning cached advice for user {request.user_id}")
+        yield orjson.dumps({"relevant_documents": cached_response.relevant_documents}) + b"\n"
+        yield orjson.dumps({"delta": cached_response.advice}) + b"\n"
+        return
+
+    user_prompt, relevant_docs = advisor._build_advice_prompt(holdings, relevant_documents)
+    yield orjson.dumps({"relevant_documents": relevant_docs}) + b"\n"
+
+    advice_parts: List[str] = []
+    stream_status: Dict[str, Any] = {}
+    async for delta in advisor.stream_financial_advice(
+        user_prompt, advice_parts, _max_output_tokens(relevant_documents), stream_status
+    ):
+        yield orjson.dumps({"delta": delta}) + b"\n"
+
+    if "error" in stream_status:
+        # Partial answers are never cached; tell the client the stream was cut short.
+        yield orjson.dumps({"error": "Advice generation was interrupted"}) + b"\n"
+        return
+
+    advice = "".join(advice_parts)
+    if stream_status["completed"] and advice:
+        async with _advice_cache_lock:
+            _advice_cache[cache_key] = AdviceResponse(
+                advice=advice, relevant_documents=relevant_docs
+            )
+
+    logger.info(f"Finished streaming advice for user {request.user_id}")
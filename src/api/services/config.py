@@ -1,3 +1,5 @@
+import os
+
 SYSTEM_PROMPT = """
 You are a financial advisor that provides advice based on recent reddit market posts. 
 Analyze the user's current portfolio and provide concise, personalized investment advice based on the reddit posts provided. 
@@ -9,14 +11,47 @@ Format your response with:
 3. Risk Assessment
 4. Next Steps"""
 
+ADVICE_PROMPT_TEMPLATE = """Current Portfolio:
+{portfolio_summary}
+
+Relevant Reddit Posts:
+{market_context}
+
+Please provide comprehensive financial advice based on the above information.
+"""
+
 MODEL_NAME = "gpt-5-nano"
 
 RETRIEVER_K = 3
 
 RELEVANT_DOCUMENTS_TOP_K = 5
 
+# Squared L2 distance on normalized embeddings; 0.6 matches cosine similarity 0.7
+MAX_RELEVANT_DISTANCE = float(os.getenv("MAX_RELEVANT_DISTANCE", "0.6"))
+
 MAX_TOKENS = 6000
 
+ADVICE_BASE_OUTPUT_TOKENS = int(os.getenv("ADVICE_BASE_OUTPUT_TOKENS", "3000"))
+ADVICE_OUTPUT_TOKENS_PER_DOCUMENT = int(os.getenv("ADVICE_OUTPUT_TOKENS_PER_DOCUMENT", "600"))
+
+MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv("MAX_CONCURRENT_LLM_REQUESTS", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "100"))
+
+SEARCH_POOL_SIZE = int(os.getenv("SEARCH_POOL_SIZE", str(min(8, os.cpu_count() or 1))))
+
+ADVICE_CACHE_SIZE = int(os.getenv("ADVICE_CACHE_SIZE", "2048"))
+ADVICE_CACHE_TTL = int(os.getenv("ADVICE_CACHE_TTL", "300"))
+
+GENERAL_MARKET_CONTEXT_TTL = int(os.getenv("GENERAL_MARKET_CONTEXT_TTL", "600"))
+GENERAL_MARKET_QUERIES = (
+    "financial analysis market trends investment",
+    "portfolio diversification investment strategy",
+    "market analysis economic outlook",
+    "investment advice financial planning",
+)
+
 
 ERROR_ADVICE = """I apologize, but I encountered an error while analyzing your portfolio
 
@@ -29,3 +64,20 @@ Here are some general investment principles to consider:
 5. **Research**: Always research investments thoroughly before making decisions
 
 Please try again later, or consult with a qualified financial advisor for personalized guidance."""
+
+
+GENERATION_ERROR_ADVICE = """I apologize, but I'm currently unable to generate personalized advice
+
+However, I can suggest some general principles: diversify your portfolio, consider your risk tolerance, and regularly review your investment strategy."""
+
+
+GENERIC_ADVICE = """You don't have any holdings yet, and there isn't enough recent market discussion to tailor advice to you
+
+To get started, consider these general principles:
+
+1. **Diversification**: Spread your investments across different sectors and asset classes
+2. **Risk Management**: Only invest what you can afford to lose
+3. **Long-term Perspective**: Focus on long-term growth rather than short-term fluctuations
+4. **Research**: Always research investments thoroughly before making decisions
+
+Add some holdings to your portfolio to receive personalized advice."""
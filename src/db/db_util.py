@@ -1,13 +1,44 @@
 from asyncio.log import logger
+import asyncio
 import os
-from datetime import datetime
-from typing import List, Optional, Dict, Any
-from supabase import create_client, Client
+from functools import cache, lru_cache
+from typing import AsyncIterator, List, Optional, Dict, Any, Union
+from cachetools import TTLCache
+import httpx
+from postgrest.types import CountMethod, ReturnMethod
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 import bcrypt
 
 load_dotenv()
 
+BCRYPT_COST = int(os.getenv("BCRYPT_COST", "12"))
+SUPABASE_HTTP_RETRIES = int(os.getenv("SUPABASE_HTTP_RETRIES", "3"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "60"))
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "40"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+STOCK_METADATA_CACHE_SIZE = int(os.getenv("STOCK_METADATA_CACHE_SIZE", "4096"))
+STOCK_METADATA_CACHE_TTL = int(os.getenv("STOCK_METADATA_CACHE_TTL", "3600"))
+
+USER_PUBLIC_COLUMNS = "id,username,email,created_at"
+USER_AUTH_COLUMNS = f"{USER_PUBLIC_COLUMNS},password"
+HOLDING_COLUMNS = "user_id,stock"
+STOCK_METADATA_COLUMNS = "stock,company_name,short_name,industries,description"
+_MISSING = object()
+
+
+@cache
+def _dummy_password_hash() -> bytes:
+    # Computed on first failed lookup so importing this module skips a bcrypt round
+    return bcrypt.hashpw(b"", bcrypt.gensalt(BCRYPT_COST))
+
+
+def _quote_filter_value(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
 
 class SupabaseManager:
     def __init__(self):
@@ -21,21 +52,65 @@ class SupabaseManager:
                 "SUPABASE_URL and SUPABASE_ANON_KEY must be set in environment variables"
             )
 
-        self.client: Client = create_client(supabase_url, supabase_key)
+        self._http_client = httpx.Client(
+            transport=httpx.HTTPTransport(retries=SUPABASE_HTTP_RETRIES),
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.client: Client = create_client(
+            supabase_url, supabase_key, options=ClientOptions(httpx_client=self._http_client)
+        )
+        self._user_cache: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        self._stock_metadata_cache: TTLCache = TTLCache(
+            maxsize=STOCK_METADATA_CACHE_SIZE, ttl=STOCK_METADATA_CACHE_TTL
+        )
+        self._stock_metadata_lock = asyncio.Lock()
 
-    def _hash_password(self, password: str) -> str:
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
+    # The user cache is per process and keyed by id only, so a single pop on
+    # update or delete invalidates it. Email and username lookups always hit
+    # the database.
+    def _cache_user(self, user: Dict[str, Any]) -> None:
+        self._user_cache[user["id"]] = dict(user)
+
+    def _get_cached_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        user = self._user_cache.get(user_id)
+        return dict(user) if user is not None else None
+
+    def _invalidate_user(self, user_id: int) -> None:
+        self._user_cache.pop(user_id, None)
+
+    async def close(self) -> None:
+        try:
+            self.client.postgrest.session.close()
+            self._http_client.close()
+        except Exception as e:
+            logger.warning(f"Error closing Supabase client: {str(e)}")
+
+    async def _hash_password(self, password: str) -> str:
+        salt = bcrypt.gensalt(BCRYPT_COST)
+        hashed = await asyncio.to_thread(bcrypt.hashpw, password.encode("utf-8"), salt)
         return hashed.decode("utf-8")
 
-    def _verify_password(self, password: str, hashed_password: str) -> bool:
-        return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+    async def _verify_password(
+        self, password: str, hashed_password: Union[str, bytes]
+    ) -> bool:
+        if isinstance(hashed_password, str):
+            hashed_password = hashed_password.encode("utf-8")
+        try:
+            return await asyncio.to_thread(
+                bcrypt.checkpw, password.encode("utf-8"), hashed_password
+            )
+        except ValueError:
+            return False
 
     async def create_user(
         self, username: str, email: str, password: str
     ) -> Dict[str, Any]:
         try:
-            hashed_password = self._hash_password(password)
+            hashed_password = await self._hash_password(password)
 
             response = (
                 self.client.table("user")
@@ -44,7 +119,6 @@ class SupabaseManager:
                         "username": username,
                         "email": email,
                         "password": hashed_password,
-                        "created_at": datetime.now().isoformat(),
                     }
                 )
                 .execute()
@@ -63,24 +137,32 @@ class SupabaseManager:
             raise Exception(f"Error creating user: {str(e)}")
 
     async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
-        try:
-            response = self.client.table("user").select("*").eq("id", user_id).execute()
+        user = self._get_cached_user(user_id)
 
-            if response.data:
-                return response.data[0]
-            return None
+        if user is None:
+            try:
+                response = (
+                    self.client.table("user").select(USER_PUBLIC_COLUMNS).eq("id", user_id).execute()
+                )
+            except Exception as e:
+                raise Exception(f"Error retrieving user: {str(e)}")
 
-        except Exception as e:
-            raise Exception(f"Error retrieving user: {str(e)}")
+            if not response.data:
+                return None
+            self._cache_user(response.data[0])
+            user = dict(response.data[0])
+
+        return user
 
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         try:
             response = (
-                self.client.table("user").select("*").eq("email", email).execute()
+                self.client.table("user").select(USER_PUBLIC_COLUMNS).eq("email", email).execute()
             )
 
             if response.data:
-                return response.data[0]
+                self._cache_user(response.data[0])
+                return dict(response.data[0])
             return None
 
         except Exception as e:
@@ -89,22 +171,54 @@ class SupabaseManager:
     async def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         try:
             response = (
-                self.client.table("user").select("*").eq("username", username).execute()
+                self.client.table("user").select(USER_PUBLIC_COLUMNS).eq("username", username).execute()
             )
 
             if response.data:
-                return response.data[0]
+                self._cache_user(response.data[0])
+                return dict(response.data[0])
             return None
 
         except Exception as e:
             raise Exception(f"Error retrieving user by username: {str(e)}")
 
+    async def get_users_by_email_or_username(
+        self, email: str, username: str
+    ) -> List[Dict[str, Any]]:
+        try:
+            response = (
+                self.client.table("user")
+                .select("id,username,email")
+                .or_(
+                    f"email.eq.{_quote_filter_value(email)},"
+                    f"username.eq.{_quote_filter_value(username)}"
+                )
+                .execute()
+            )
+            return response.data
+
+        except Exception as e:
+            raise Exception(f"Error retrieving user by email or username: {str(e)}")
+
     async def verify_user_credentials(
         self, username: str, password: str
     ) -> Optional[Dict[str, Any]]:
         try:
-            user = await self.get_user_by_username(username)
-            if user and self._verify_password(password, user["password"]):
+            # Always read credentials from the database: the user cache is per
+            # worker, so it can hold a stale password or a deleted account
+            response = (
+                self.client.table("user").select(USER_AUTH_COLUMNS).eq("username", username).execute()
+            )
+            if not response.data:
+                await self._verify_password(
+                    password, await asyncio.to_thread(_dummy_password_hash)
+                )
+                return None
+
+            user = dict(response.data[0])
+            hashed_password = user.pop("password")
+            if await self._verify_password(password, hashed_password):
+                self._cache_user(user)
                 return user
             return None
         except Exception as e:
@@ -117,7 +231,7 @@ class SupabaseManager:
         username: Optional[str] = None,
         email: Optional[str] = None,
         password: Optional[str] = None,
-    ) -> Dict[str, Any]:
+    ) -> Optional[Dict[str, Any]]:
         try:
             update_data = {}
             if username is not None:
@@ -125,11 +239,12 @@ class SupabaseManager:
             if email is not None:
                 update_data["email"] = email
             if password is not None:
-                update_data["password"] = self._hash_password(password)
+                update_data["password"] = await self._hash_password(password)
 
             if not update_data:
                 raise ValueError("No fields to update")
 
+            self._invalidate_user(user_id)
             response = (
                 self.client.table("user")
                 .update(update_data)
@@ -138,31 +253,46 @@ class SupabaseManager:
             )
 
             if response.data:
-                return response.data[0]
-            else:
-                raise Exception("Failed to update user")
+                user = dict(response.data[0])
+                user.pop("password", None)
+                self._cache_user(user)
+                return user
+            return None
 
         except Exception as e:
             raise Exception(f"Error updating user: {str(e)}")
 
     async def delete_user(self, user_id: int) -> bool:
+        self._invalidate_user(user_id)
         try:
-            response = self.client.table("user").delete().eq("id", user_id).execute()
-            return len(response.data) > 0
+            response = (
+                self.client.table("user")
+                .delete(count=CountMethod.exact, returning=ReturnMethod.minimal)
+                .eq("id", user_id)
+                .execute()
+            )
+            return bool(response.count)
 
         except Exception as e:
             raise Exception(f"Error deleting user: {str(e)}")
 
     async def create_holding(self, user_id: int, stock: str) -> Dict[str, Any]:
+        holdings = await self.create_holdings(user_id, [stock])
+        return holdings[0]
+
+    async def create_holdings(self, user_id: int, stocks: List[str]) -> List[Dict[str, Any]]:
+        if not stocks:
+            return []
+
         try:
             response = (
                 self.client.table("holding")
-                .insert({"user_id": user_id, "stock": stock})
+                .insert([{"user_id": user_id, "stock": stock} for stock in stocks])
                 .execute()
             )
 
             if response.data:
-                return response.data[0]
+                return response.data
             else:
                 raise Exception("Failed to create holding")
 
@@ -173,7 +303,7 @@ class SupabaseManager:
         try:
             response = (
                 self.client.table("holding")
-                .select("*")
+                .select(HOLDING_COLUMNS)
                 .eq("user_id", user_id)
                 .execute()
             )
@@ -182,57 +312,121 @@ class SupabaseManager:
         except Exception as e:
             raise Exception(f"Error retrieving user holdings: {str(e)}")
 
+    async def iter_holdings_by_user(
+        self, user_id: int, page_size: int = 1000
+    ) -> AsyncIterator[Dict[str, Any]]:
+        start = 0
+        while True:
+            try:
+                response = (
+                    self.client.table("holding")
+                    .select(HOLDING_COLUMNS)
+                    .eq("user_id", user_id)
+                    .order("stock")
+                    .range(start, start + page_size - 1)
+                    .execute()
+                )
+            except Exception as e:
+                raise Exception(f"Error streaming user holdings: {str(e)}")
+
+            for holding in response.data:
+                yield holding
+
+            if len(response.data) < page_size:
+                break
+            start += page_size
+
     async def delete_holding_by_user_and_stock(self, user_id: int, stock: str) -> bool:
+        return await self.delete_holdings(user_id, [stock]) > 0
+
+    async def delete_holdings(self, user_id: int, stocks: List[str]) -> int:
+        if not stocks:
+            return 0
+
         try:
             response = (
                 self.client.table("holding")
-                .delete()
+                .delete(count=CountMethod.exact, returning=ReturnMethod.minimal)
                 .eq("user_id", user_id)
-                .eq("stock", stock)
+                .in_("stock", stocks)
                 .execute()
             )
-            return len(response.data) > 0
+            return response.count or 0
 
         except Exception as e:
             raise Exception(f"Error deleting holding by user and stock: {str(e)}")
 
     async def get_stock_metadata(self, stock: str) -> Optional[Dict[str, Any]]:
-        try:
-            response = (
-                self.client.table("stock_metadata")
-                .select("*")
-                .eq("stock", stock)
-                .execute()
-            )
+        metadata = await self.get_stock_metadata_bulk([stock])
+        return metadata.get(stock)
+
+    def _get_cached_stock_metadata(
+        self, stocks: List[str], metadata: Dict[str, Dict[str, Any]]
+    ) -> List[str]:
+        missing = []
+        for stock in stocks:
+            cached = self._stock_metadata_cache.get(stock, _MISSING)
+            if cached is _MISSING:
+                missing.append(stock)
+            elif cached is not None:
+                metadata[stock] = cached
+        return missing
+
+    async def get_stock_metadata_bulk(self, stocks: List[str]) -> Dict[str, Dict[str, Any]]:
+        metadata: Dict[str, Dict[str, Any]] = {}
+        missing = self._get_cached_stock_metadata(stocks, metadata)
+        if not missing:
+            return metadata
+
+        # Re-check under the lock so concurrent misses for the same stocks
+        # share one query
+        async with self._stock_metadata_lock:
+            to_fetch = self._get_cached_stock_metadata(missing, metadata)
+            if not to_fetch:
+                return metadata
+
+            try:
+                response = (
+                    self.client.table("stock_metadata")
+                    .select(STOCK_METADATA_COLUMNS)
+                    .in_("stock", to_fetch)
+                    .execute()
+                )
+            except Exception as e:
+                raise Exception(f"Error retrieving stock metadata in bulk: {str(e)}")
 
-            if response.data:
-                return response.data[0]
-            return None
+            fetched = {row["stock"]: row for row in response.data}
+            for stock in to_fetch:
+                self._stock_metadata_cache[stock] = fetched.get(stock)
+            metadata.update(fetched)
 
-        except Exception as e:
-            raise Exception(f"Error retrieving stock metadata: {str(e)}")
+        return metadata
+
+
+@lru_cache(maxsize=1)
+def get_supabase_manager() -> SupabaseManager:
+    return SupabaseManager()
 
 
 async def create_user(username: str, email: str, password: str) -> Dict[str, Any]:
-    manager = SupabaseManager()
-    return await manager.create_user(username, email, password)
+    return await get_supabase_manager().create_user(username, email, password)
 
 
 async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
-    manager = SupabaseManager()
-    return await manager.get_user_by_id(user_id)
+    return await get_supabase_manager().get_user_by_id(user_id)
 
 
 async def create_holding(user_id: int, stock: str) -> Dict[str, Any]:
-    manager = SupabaseManager()
-    return await manager.create_holding(user_id, stock)
+    return await get_supabase_manager().create_holding(user_id, stock)
 
 
 async def get_user_holdings(user_id: int) -> List[Dict[str, Any]]:
-    manager = SupabaseManager()
-    return await manager.get_holdings_by_user(user_id)
+    return await get_supabase_manager().get_holdings_by_user(user_id)
 
 
 async def get_stock_metadata(stock: str) -> Optional[Dict[str, Any]]:
-    manager = SupabaseManager()
-    return await manager.get_stock_metadata(stock)
+    return await get_supabase_manager().get_stock_metadata(stock)
+
+
+async def get_stock_metadata_bulk(stocks: List[str]) -> Dict[str, Dict[str, Any]]:
+    return await get_supabase_manager().get_stock_metadata_bulk(stocks)
@@ -8,6 +8,7 @@ EMBEDDER_CONFIG = {
     "cache_folder": os.path.join(PROJECT_ROOT, "./models/embedders/bge-base-en-v1.5"),
     "model_kwargs": {
         "device": "cuda",
+        "model_kwargs": {"torch_dtype": os.getenv("EMBEDDER_DTYPE", "float16")},
     },
     "encode_kwargs": {
         "batch_size": 64,
@@ -24,14 +25,33 @@ RECURSIVE_CHARACTER_TEXT_SPLITTER_CONFIG = {
 }
 
 
+HNSW_CONFIG = {
+    "hnsw:space": "l2",
+    "hnsw:M": int(os.getenv("HNSW_M", "16")),
+    "hnsw:construction_ef": int(os.getenv("HNSW_CONSTRUCTION_EF", "100")),
+    "hnsw:search_ef": int(os.getenv("HNSW_SEARCH_EF", "10")),
+}
+
+
 VECTOR_STORE_CONFIG = {
     "collection_name": "documents",
     "persist_directory": os.path.join(PROJECT_ROOT, "chroma_db"),
     "chunk_size": 1000,
     "chunk_overlap": 200,
     "batch_size": 64,
+    "max_concurrent_batches": 4,
+    "split_shard_size": 64,
+    "split_workers": int(os.getenv("SPLIT_WORKERS", "0")) or None,
+    "embed_chunk_size": 512,
+    "stream_batch_size": 16,
     "top_k": 5,
+    "query_cache_size": int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    "query_cache_ttl": int(os.getenv("QUERY_CACHE_TTL", "300")),
+    "semantic_cache_size": int(os.getenv("SEMANTIC_CACHE_SIZE", "0")),
+    "semantic_cache_threshold": float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97")),
     "embedder_type": "local",
     "embedder_kwargs": EMBEDDER_CONFIG,
+    "text_splitter": os.getenv("TEXT_SPLITTER", "recursive"),
     "recursive_character_text_splitter": RECURSIVE_CHARACTER_TEXT_SPLITTER_CONFIG,
+    "collection_metadata": HNSW_CONFIG,
 }
@@ -0,0 +1,98 @@
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+from cachetools import TTLCache
+
+
+class QueryCache:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache: TTLCache = TTLCache(maxsize=max_size, ttl=ttl_seconds)
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": len(self._cache),
+                "max_size": int(self._cache.maxsize),
+            }
+
+
+class SemanticCache:
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._matrix: Optional[np.ndarray] = None
+        self._payloads: List[Any] = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, embedding: np.ndarray) -> Optional[Any]:
+        with self._lock:
+            if self._size == 0:
+                self._misses += 1
+                return None
+
+            scores = self._matrix[: self._size] @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                self._hits += 1
+                return self._payloads[best]
+
+            self._misses += 1
+            return None
+
+    def set(self, embedding: np.ndarray, value: Any) -> None:
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((self.capacity, embedding.shape[0]), dtype=np.float32)
+
+            self._matrix[self._next] = embedding
+            self._payloads[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._payloads = [None] * self.capacity
+            self._size = 0
+            self._next = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": self._size,
+                "max_size": self.capacity,
+            }
+
+
+def normalize_embedding(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
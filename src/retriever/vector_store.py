@@ -1,35 +1,197 @@
 import asyncio
+import atexit
+import hashlib
 import logging
+import multiprocessing
+import os
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
+import orjson
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from retriever.embedder import get_embedder
+from retriever.query_cache import QueryCache, SemanticCache, normalize_embedding
 
 logger = logging.getLogger(__name__)
 
-_vector_store_instance = None
-_vector_store_config = None
+_vector_stores: Dict[Tuple[Optional[str], Optional[str]], "AsyncVectorStore"] = {}
+_vector_stores_lock = threading.Lock()
+
+CONTENT_HASH_LOOKUP_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True, slots=True)
+class VectorStoreSettings:
+    collection_name: str
+    persist_directory: str
+    batch_size: int
+    max_concurrent_batches: int
+    split_shard_size: int
+    split_workers: int
+    embed_chunk_size: int
+    stream_batch_size: int
+    top_k: int
+    chunk_size: int
+    chunk_overlap: int
+    length_function: Callable[[str], int]
+    separators: Tuple[str, ...]
+    text_splitter: str = "recursive"
+    query_cache_size: int = 1024
+    query_cache_ttl: float = 300
+    semantic_cache_size: int = 0
+    semantic_cache_threshold: float = 0.97
+    collection_metadata: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "VectorStoreSettings":
+        splitter_config = config["recursive_character_text_splitter"]
+        return cls(
+            collection_name=config["collection_name"],
+            persist_directory=config["persist_directory"],
+            batch_size=config["batch_size"],
+            max_concurrent_batches=config.get("max_concurrent_batches", 4),
+            split_shard_size=config.get("split_shard_size", 64),
+            split_workers=config.get("split_workers") or os.cpu_count() or 1,
+            embed_chunk_size=config.get("embed_chunk_size", 512),
+            stream_batch_size=config.get("stream_batch_size", 16),
+            top_k=config["top_k"],
+            chunk_size=splitter_config["chunk_size"],
+            chunk_overlap=splitter_config["chunk_overlap"],
+            length_function=splitter_config["length_function"],
+            separators=tuple(splitter_config["separators"]),
+            text_splitter=config.get("text_splitter", "recursive"),
+            query_cache_size=config.get("query_cache_size", 1024),
+            query_cache_ttl=config.get("query_cache_ttl", 300),
+            semantic_cache_size=config.get("semantic_cache_size", 0),
+            semantic_cache_threshold=config.get("semantic_cache_threshold", 0.97),
+            collection_metadata=config.get("collection_metadata"),
+        )
+
+
+@lru_cache(maxsize=8)
+def _make_splitter(
+    chunk_size: int,
+    chunk_overlap: int,
+    length_function: Callable[[str], int],
+    separators: Tuple[str, ...],
+) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=length_function,
+        separators=list(separators),
+    )
+
+
+@lru_cache(maxsize=8)
+def _make_fast_chunker(chunk_size: int, chunk_overlap: int):
+    try:
+        from chonkie import FastChunker
+    except ImportError as e:
+        raise ImportError(
+            "TEXT_SPLITTER=fast needs the optional chonkie package: pip install chonkie"
+        ) from e
+
+    return FastChunker(chunk_size=chunk_size, overlap=chunk_overlap)
+
+
+def _fast_split_documents(
+    documents: List[Document], splitter_kwargs: Dict[str, Any]
+) -> List[Document]:
+    chunker = _make_fast_chunker(
+        splitter_kwargs["chunk_size"], splitter_kwargs["chunk_overlap"]
+    )
+    chunk_batches = chunker.chunk_batch([doc.page_content for doc in documents])
+    return [
+        Document(page_content=chunk.text, metadata=dict(doc.metadata))
+        for doc, chunks in zip(documents, chunk_batches)
+        for chunk in chunks
+    ]
+
+
+def _split_documents(
+    documents: List[Document], splitter_kwargs: Dict[str, Any], text_splitter: str = "recursive"
+) -> List[Document]:
+    if text_splitter == "fast":
+        return _fast_split_documents(documents, splitter_kwargs)
+    return _make_splitter(**splitter_kwargs).split_documents(documents)
+
+
+@lru_cache(maxsize=1)
+def _get_write_executor() -> ThreadPoolExecutor:
+    # One writer thread shared by every store keeps Chroma writes serialized
+    # without leaving a thread behind per instance
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-write")
+
+
+@lru_cache(maxsize=4)
+def _get_shared_split_pool(max_workers: int) -> ProcessPoolExecutor:
+    # Forking after torch, CUDA or Chroma threads have started can deadlock the
+    # child, so split workers always start from a fresh interpreter
+    pool = ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+    atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+    return pool
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _query_cache_key(
+    query: str, top_k: int, filter_dict: Optional[Dict[str, Any]]
+) -> Tuple[str, int, Optional[bytes]]:
+    filter_key = orjson.dumps(filter_dict, option=orjson.OPT_SORT_KEYS) if filter_dict else None
+    return query, top_k, filter_key
 
 
 class AsyncVectorStore:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, split_pool: Optional[ProcessPoolExecutor] = None):
         self.config = config
+        self.settings = VectorStoreSettings.from_config(config)
         self.embeddings = get_embedder()
         self.vector_store = Chroma(
-            collection_name=config.get("collection_name"),
+            collection_name=self.settings.collection_name,
             embedding_function=self.embeddings,
-            persist_directory=config.get("persist_directory"),
+            persist_directory=self.settings.persist_directory,
+            collection_metadata=self.settings.collection_metadata,
         )
 
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.get("recursive_character_text_splitter").get("chunk_size"),
-            chunk_overlap=config.get("recursive_character_text_splitter").get("chunk_overlap"),
-            length_function=config.get("recursive_character_text_splitter").get("length_function"),
-            separators=config.get("recursive_character_text_splitter").get("separators"),
+        self._splitter_kwargs = {
+            "chunk_size": self.settings.chunk_size,
+            "chunk_overlap": self.settings.chunk_overlap,
+            "length_function": self.settings.length_function,
+            "separators": self.settings.separators,
+        }
+        if self.settings.text_splitter == "fast":
+            self.text_splitter = _make_fast_chunker(
+                self.settings.chunk_size, self.settings.chunk_overlap
+            )
+        else:
+            self.text_splitter = _make_splitter(**self._splitter_kwargs)
+        self._split_pool: Optional[ProcessPoolExecutor] = split_pool
+        self._doc_count: Optional[int] = None
+
+        self.query_cache = QueryCache(
+            max_size=self.settings.query_cache_size,
+            ttl_seconds=self.settings.query_cache_ttl,
+        )
+        self.semantic_cache = (
+            SemanticCache(
+                capacity=self.settings.semantic_cache_size,
+                threshold=self.settings.semantic_cache_threshold,
+            )
+            if self.settings.semantic_cache_size > 0
+            else None
         )
 
         self._log_configs()
@@ -48,7 +210,9 @@ class AsyncVectorStore:
             logger.info(
                 f"Starting to add {len(documents)} documents. Initial count: {initial_count}"
             )
-            await self.add_documents_stream(documents)
+            if not await self._add_new_documents(documents):
+                return
+            self._clear_query_caches()
 
             final_count = self.get_document_count()
 
@@ -62,47 +226,199 @@ class AsyncVectorStore:
         finally:
             pass
 
-    async def add_documents_stream(self, documents: List[Document]) -> None:
-        chunk_queue = asyncio.Queue(maxsize=100)
-        consumer_task = asyncio.create_task(self._chunk_consumer(chunk_queue))
-        producer_task = asyncio.create_task(self._chunk_producer(documents, chunk_queue))
-
-        await asyncio.gather(producer_task, consumer_task)
-
-    async def _chunk_consumer(self, chunk_queue: asyncio.Queue) -> None:
-        batch = []
-        batch_size = self.config.get("batch_size")
+    async def add_documents_from_stream(self, documents: AsyncIterator[Document]) -> int:
+        stream_batch_size = self.settings.stream_batch_size
+        # Bound the batches in flight so a fast producer waits instead of
+        # queueing the whole stream in memory
+        semaphore = asyncio.Semaphore(self.settings.max_concurrent_batches)
+        # Concurrent batches check the collection before any of them writes,
+        # so duplicates within the stream are dropped here
+        seen_hashes = set()
+        tasks = []
+        batch: List[Document] = []
+
+        async def add_batch(batch: List[Document]) -> int:
+            try:
+                return await self._add_new_documents(batch)
+            finally:
+                semaphore.release()
+
+        async def submit(batch: List[Document]) -> None:
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(add_batch(batch)))
+
+        completed = False
+        try:
+            async for document in documents:
+                content_hash = _content_hash(document.page_content)
+                if content_hash in seen_hashes:
+                    continue
+                seen_hashes.add(content_hash)
+
+                batch.append(document)
+                if len(batch) >= stream_batch_size:
+                    await submit(batch)
+                    batch = []
+
+            if batch:
+                await submit(batch)
+
+            added = sum(await asyncio.gather(*tasks))
+            completed = True
+        finally:
+            if not completed:
+                # Don't leave batches writing in the background after the
+                # producer or a sibling batch failed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self._clear_query_caches()
+
+        if added:
+            self._clear_query_caches()
+        logger.info(f"Added {added} new documents from stream")
+        return added
+
+    async def _add_new_documents(self, documents: List[Document]) -> int:
+        new_documents = await asyncio.to_thread(self._filter_new_documents, documents)
+        logger.info(f"Skipping {len(documents) - len(new_documents)} already indexed documents")
+        if new_documents:
+            chunk_count = await self.add_documents_stream(new_documents)
+            logger.info(f"Indexed {len(new_documents)} documents as {chunk_count} chunks")
+        return len(new_documents)
+
+    def _clear_query_caches(self) -> None:
+        self.query_cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+
+    def _filter_new_documents(self, documents: List[Document]) -> List[Document]:
+        hashed_documents = {}
+        for doc in documents:
+            content_hash = _content_hash(doc.page_content)
+            if content_hash not in hashed_documents:
+                hashed_documents[content_hash] = Document(
+                    page_content=doc.page_content,
+                    metadata={**doc.metadata, "content_hash": content_hash},
+                )
+
+        hashes = list(hashed_documents)
+        for start in range(0, len(hashes), CONTENT_HASH_LOOKUP_BATCH_SIZE):
+            batch = hashes[start : start + CONTENT_HASH_LOOKUP_BATCH_SIZE]
+            existing = self.vector_store._collection.get(
+                where={"content_hash": {"$in": batch}},
+                include=["metadatas"],
+            )
+            for metadata in existing["metadatas"]:
+                hashed_documents.pop(metadata.get("content_hash"), None)
 
-        while True:
-            chunk = await chunk_queue.get()
-            if chunk is None:
-                break
+        return list(hashed_documents.values())
 
-            batch.append(chunk)
+    async def add_documents_stream(self, documents: List[Document]) -> int:
+        batch_size = self.settings.batch_size
+        shard_size = self.settings.split_shard_size
+        semaphore = asyncio.Semaphore(self.settings.max_concurrent_batches)
 
-            if len(batch) >= batch_size:
+        async def add_batch(batch: List[Document]) -> None:
+            async with semaphore:
                 await self._add_batch_async(batch)
-                batch = []
 
-        if batch:
-            await self._add_batch_async(batch)
+        loop = asyncio.get_running_loop()
+        split_pool = self._get_split_pool()
+        shards = [
+            loop.run_in_executor(
+                split_pool,
+                _split_documents,
+                documents[start : start + shard_size],
+                self._splitter_kwargs,
+                self.settings.text_splitter,
+            )
+            for start in range(0, len(documents), shard_size)
+        ]
+
+        tasks = []
+        pending: List[Document] = []
+        chunk_count = 0
+        for shard in asyncio.as_completed(shards):
+            chunks = await shard
+            # Group similar-length chunks so the embedder pads each batch less
+            chunks.sort(key=lambda chunk: len(chunk.page_content), reverse=True)
+            chunk_count += len(chunks)
+            pending.extend(chunks)
+            while len(pending) >= batch_size:
+                tasks.append(asyncio.create_task(add_batch(pending[:batch_size])))
+                pending = pending[batch_size:]
+
+        if pending:
+            tasks.append(asyncio.create_task(add_batch(pending)))
+
+        await asyncio.gather(*tasks)
+        return chunk_count
+
+    def reset(self) -> None:
+        self.vector_store.reset_collection()
+        self._doc_count = None
+        self._clear_query_caches()
+
+    def _get_split_pool(self) -> ProcessPoolExecutor:
+        if self._split_pool is None:
+            self._split_pool = _get_shared_split_pool(self.settings.split_workers)
+        return self._split_pool
+
+    def close(self) -> None:
+        # The split pool and writer thread are owned by the caller or shared at
+        # module level, so closing a store only drops its reference
+        self._split_pool = None
 
     async def _add_batch_async(self, documents: List[Document]) -> None:
         logger.info(f"Adding batch of {len(documents)} documents to vector store")
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self.vector_store.add_documents, documents)
-        logger.info(f"Successfully added batch of {len(documents)} documents")
+        texts = [doc.page_content for doc in documents]
+        embed_chunk_size = self.settings.embed_chunk_size
 
-    async def _chunk_producer(self, documents: List[Document], chunk_queue: asyncio.Queue) -> None:
-        total_chunks = 0
-        for document in documents:
-            chunks = await self.text_splitter.atransform_documents([document])
-            total_chunks += len(chunks)
+        embedded_parts = await asyncio.gather(
+            *(
+                self.embeddings.aembed_documents(texts[start : start + embed_chunk_size])
+                for start in range(0, len(texts), embed_chunk_size)
+            )
+        )
+        embeddings = [embedding for part in embedded_parts for embedding in part]
 
-            for chunk in chunks:
-                await chunk_queue.put(chunk)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                _get_write_executor(), self._write_embedded, documents, texts, embeddings
+            )
+        except Exception:
+            self._doc_count = None
+            raise
 
-        await chunk_queue.put(None)
+        if self._doc_count is not None:
+            if any(getattr(doc, "id", None) for doc in documents):
+                self._doc_count = None
+            else:
+                self._doc_count += len(documents)
+        logger.info(f"Successfully added batch of {len(documents)} documents")
+
+    def _write_embedded(
+        self, documents: List[Document], texts: List[str], embeddings: List[List[float]]
+    ) -> None:
+        ids = [getattr(doc, "id", None) or str(uuid.uuid4()) for doc in documents]
+        with_metadata = [i for i, doc in enumerate(documents) if doc.metadata]
+        without_metadata = [i for i, doc in enumerate(documents) if not doc.metadata]
+
+        if with_metadata:
+            self.vector_store._collection.upsert(
+                ids=[ids[i] for i in with_metadata],
+                embeddings=[embeddings[i] for i in with_metadata],
+                documents=[texts[i] for i in with_metadata],
+                metadatas=[documents[i].metadata for i in with_metadata],
+            )
+        if without_metadata:
+            self.vector_store._collection.upsert(
+                ids=[ids[i] for i in without_metadata],
+                embeddings=[embeddings[i] for i in without_metadata],
+                documents=[texts[i] for i in without_metadata],
+            )
 
     def search(
         self,
@@ -110,15 +426,77 @@ class AsyncVectorStore:
         top_k: Optional[int] = None,
         filter_dict: Optional[Dict[str, Any]] = None,
     ) -> List[Tuple[Document, float]]:
+        return self.search_batch([query], top_k, filter_dict)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: Optional[int] = None,
+        filter_dict: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        if not queries:
+            return []
+
         if top_k is None:
-            top_k = self.config.get("top_k")
+            top_k = self.settings.top_k
+
+        cache_keys = [_query_cache_key(query, top_k, filter_dict) for query in queries]
+        batch_results = [self.query_cache.get(key) for key in cache_keys]
+        missing = [i for i, cached in enumerate(batch_results) if cached is None]
+
+        if not missing:
+            return [list(results) for results in batch_results]
+
+        embeddings = self.embeddings.embed_documents([queries[i] for i in missing])
+        use_semantic_cache = filter_dict is None and self.semantic_cache is not None
+
+        to_search = []
+        for i, embedding in zip(missing, embeddings):
+            if use_semantic_cache:
+                normalized = normalize_embedding(embedding)
+                cached = self.semantic_cache.get(normalized)
+                if cached is not None and cached[0] >= top_k:
+                    batch_results[i] = cached[1][:top_k]
+                    self.query_cache.set(cache_keys[i], batch_results[i])
+                    continue
+            to_search.append((i, embedding))
+
+        if to_search:
+            results = self.vector_store._collection.query(
+                query_embeddings=[embedding for _, embedding in to_search],
+                n_results=top_k,
+                where=filter_dict,
+                include=["documents", "metadatas", "distances"],
+            )
 
-        results = self.vector_store.similarity_search_with_score(
-            query,
-            top_k,
-            filter_dict,
-        )
-        return results
+            for (i, embedding), contents, metadatas, distances in zip(
+                to_search, results["documents"], results["metadatas"], results["distances"]
+            ):
+                batch_results[i] = tuple(
+                    (Document(page_content=content, metadata=metadata or {}), distance)
+                    for content, metadata, distance in zip(contents, metadatas, distances)
+                )
+                self.query_cache.set(cache_keys[i], batch_results[i])
+                if use_semantic_cache:
+                    self.semantic_cache.set(
+                        normalize_embedding(embedding), (top_k, batch_results[i])
+                    )
+
+        return [list(results) for results in batch_results]
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {"query_cache": self.query_cache.stats()}
+        if self.semantic_cache is not None:
+            stats["semantic_cache"] = self.semantic_cache.stats()
+        return stats
+
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: Optional[int] = None,
+        filter_dict: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        return await asyncio.to_thread(self.search_batch, queries, top_k, filter_dict)
 
     def search_with_embedding(
         self,
@@ -129,11 +507,18 @@ class AsyncVectorStore:
         results = self.vector_store.similarity_search_by_vector(embedding, top_k, filter_dict)
         return results
 
+    def warm_up(self) -> None:
+        self.embeddings.embed_query("financial analysis market trends investment")
+
     def get_document_count(self) -> int:
+        if self._doc_count is not None:
+            return self._doc_count
+
         try:
             collection = self.vector_store._collection
             if collection:
-                return collection.count()
+                self._doc_count = collection.count()
+                return self._doc_count
             return 0
         except Exception as e:
             logger.error(f"Error getting document count: {e}")
@@ -141,11 +526,20 @@ class AsyncVectorStore:
 
 
 def get_vector_store(config: dict) -> AsyncVectorStore:
-    global _vector_store_instance, _vector_store_config
-
-    if _vector_store_instance is not None and _vector_store_config == config:
-        return _vector_store_instance
-
-    _vector_store_instance = AsyncVectorStore(config)
-    _vector_store_config = config
-    return _vector_store_instance
+    key = (config.get("persist_directory"), config.get("collection_name"))
+
+    vector_store = _vector_stores.get(key)
+    if vector_store is None:
+        with _vector_stores_lock:
+            vector_store = _vector_stores.get(key)
+            if vector_store is None:
+                vector_store = AsyncVectorStore(config)
+                _vector_stores[key] = vector_store
+                return vector_store
+
+    if vector_store.settings != VectorStoreSettings.from_config(config):
+        raise ValueError(
+            f"Vector store for collection {key[1]} in {key[0]} already exists "
+            f"with different settings"
+        )
+    return vector_store
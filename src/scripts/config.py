@@ -2,21 +2,26 @@ REDDIT_PULL_CONFIG = [
     {
         "subreddit_name": "WallStreetBets",
         "hours": 12,
+        "posts_per_hour": 40,
     },
     {
         "subreddit_name": "Investing",
         "hours": 12,
+        "posts_per_hour": 10,
     },
     {
         "subreddit_name": "Stocks",
         "hours": 12,
+        "posts_per_hour": 10,
     },
     {
         "subreddit_name": "StockMarket",
         "hours": 12,
+        "posts_per_hour": 8,
     },
     {
         "subreddit_name": "StockMarketNews",
         "hours": 12,
+        "posts_per_hour": 4,
     },
 ]
@@ -1,12 +1,13 @@
-import json
+import asyncio
 import logging
 import os
 from datetime import UTC, datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-import praw
-from time import sleep
+import asyncpraw
+import orjson
+import zstandard as zstd
 from dotenv import load_dotenv
 from langchain_core.documents import Document
 
@@ -21,44 +22,82 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+HIGHWATER_PATH = Path("data/reddit/.highwater.json")
+POSTS_ZSTD_LEVEL = 3
+
 
 class RedditScraper:
     def __init__(
         self, client_id: str, client_secret: str, user_agent: str, subreddit_name: str
     ):
-        self.reddit = praw.Reddit(
+        self.reddit = asyncpraw.Reddit(
             client_id=client_id, client_secret=client_secret, user_agent=user_agent
         )
 
-    def get_posts_from_last_hours(
+    async def close(self) -> None:
+        await self.reddit.close()
+
+    async def get_posts_from_last_hours(
         self, subreddit_name: str, hours: int
     ) -> List[Dict[str, Any]]:
+        posts = [
+            post async for post in self.iter_posts_from_last_hours(subreddit_name, hours)
+        ]
+        logger.info(f"Total posts found: {len(posts)}")
+        return posts
+
+    async def iter_posts_from_last_hours(
+        self,
+        subreddit_name: str,
+        hours: int,
+        since_utc: float = 0,
+        posts_per_hour: Optional[float] = None,
+        listing_status: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # listing_status["complete"] is True once the listing reached the cutoff
+        # or the previous high-water mark, or ran out before hitting the limit
+        if listing_status is None:
+            listing_status = {}
+        listing_status["complete"] = False
         cutoff_time = datetime.now(UTC) - timedelta(hours=hours)
         cutoff_timestamp = cutoff_time.timestamp()
+        limit = max(25, int(hours * posts_per_hour * 1.5)) if posts_per_hour else None
 
-        posts = []
         logger.info(
             f"Fetching posts from r/{subreddit_name} from the last {hours} hours..."
         )
 
         try:
-            subreddit = self.reddit.subreddit(subreddit_name)
-            for submission in subreddit.new(limit=None):
-                if submission.created_utc >= cutoff_timestamp:
+            subreddit = await self.reddit.subreddit(subreddit_name)
+            seen = 0
+            async for submission in subreddit.new(limit=limit):
+                seen += 1
+                if (
+                    submission.created_utc >= cutoff_timestamp
+                    and submission.created_utc > since_utc
+                ):
                     post_data = self._extract_post_data(submission)
-                    posts.append(post_data)
                     logger.info(f"Found post: {post_data['title'][:50]}...")
+                    yield post_data
                 else:
-                    logger.info(f"Reached posts older than {hours} hours, stopping...")
+                    logger.info(
+                        f"Reached posts older than {hours} hours or already pulled, stopping..."
+                    )
+                    listing_status["complete"] = True
                     break
+            else:
+                if limit is None or seen < limit:
+                    listing_status["complete"] = True
+                else:
+                    logger.warning(
+                        f"Hit the listing limit of {limit} posts for r/{subreddit_name} "
+                        "before reaching older posts; raise posts_per_hour to avoid gaps"
+                    )
 
         except Exception as e:
             logger.error(f"Error fetching posts: {e}")
             raise
 
-        logger.info(f"Total posts found: {len(posts)}")
-        return posts
-
     def _extract_post_data(self, submission) -> Dict[str, Any]:
         return {
             "id": submission.id,
@@ -85,33 +124,50 @@ class RedditScraper:
     ) -> str:
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{subreddit_name}_posts_{timestamp}.json"
+            filename = f"{subreddit_name}_posts_{timestamp}.json.zst"
 
         output_dir = Path("data/reddit")
         output_dir.mkdir(parents=True, exist_ok=True)
 
         filepath = output_dir / filename
 
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(
-                {
-                    "metadata": {
-                        "subreddit": subreddit_name,
-                        "scraped_at": datetime.now().isoformat(),
-                        "total_posts": len(posts),
-                        "time_window_hours": hours,
-                    },
-                    "posts": posts,
-                },
-                f,
-                indent=2,
-                ensure_ascii=False,
+        compressor = zstd.ZstdCompressor(level=POSTS_ZSTD_LEVEL, threads=-1)
+        with open(filepath, "wb") as raw, compressor.stream_writer(raw) as f:
+            f.write(
+                orjson.dumps(
+                    {
+                        "metadata": {
+                            "subreddit": subreddit_name,
+                            "scraped_at": datetime.now().isoformat(),
+                            "total_posts": len(posts),
+                            "time_window_hours": hours,
+                        },
+                        "posts": posts,
+                    }
+                )
             )
 
         logger.info(f"Saved {len(posts)} posts to {filepath}")
         return str(filepath)
 
 
+def load_highwater() -> Dict[str, float]:
+    try:
+        with open(HIGHWATER_PATH, "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable high-water file {HIGHWATER_PATH}: {e}")
+        return {}
+
+
+def save_highwater(highwater: Dict[str, float]) -> None:
+    HIGHWATER_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(HIGHWATER_PATH, "wb") as f:
+        f.write(orjson.dumps(highwater, option=orjson.OPT_INDENT_2))
+
+
 def load_reddit_credentials() -> Dict[str, str]:
     client_id = os.getenv("REDDIT_CLIENT_ID")
     client_secret = os.getenv("REDDIT_CLIENT_SECRET")
@@ -124,7 +180,12 @@ def load_reddit_credentials() -> Dict[str, str]:
     }
 
 
-def main(subreddit_name: str, hours: int):
+async def main(
+    subreddit_name: str,
+    hours: int,
+    since_utc: float = 0,
+    posts_per_hour: Optional[float] = None,
+) -> float:
     logger.info(f"=== Starting to process r/{subreddit_name} ===")
 
     try:
@@ -138,53 +199,45 @@ def main(subreddit_name: str, hours: int):
             subreddit_name=subreddit_name,
         )
 
-        posts = scraper.get_posts_from_last_hours(
-            subreddit_name=subreddit_name, hours=hours
-        )
-
-        logger.info(f"Retrieved {len(posts)} posts from r/{subreddit_name}")
-
-        logger.info("Initializing vector store...")
         vector_store = get_vector_store(VECTOR_STORE_CONFIG)
-        logger.info("Vector store initialized successfully")
-
-        initial_count = vector_store.get_document_count()
-        logger.info(f"Initial document count in vector store: {initial_count}")
-
-        documents = [
-            Document(
-                page_content=post["title"] + "\n" + (post["selftext"] or ""),
-                metadata={"source": post["permalink"], "timestamp": timestamp},
-            )
-            for post in posts
-            if post["title"] and (post["title"] + (post["selftext"] or "")).strip()
-        ]
-
-        logger.info(f"Created {len(documents)} valid documents from {len(posts)} posts")
+        posts = []
+        listing_status: Dict[str, Any] = {}
 
-        if not documents:
-            logger.warning("No valid documents to add to vector store")
-            return
+        metadata_base = {"timestamp": timestamp}
 
-        logger.info("Adding documents to vector store...")
-        import asyncio
+        async def documents() -> AsyncIterator[Document]:
+            async for post in scraper.iter_posts_from_last_hours(
+                subreddit_name=subreddit_name,
+                hours=hours,
+                since_utc=since_utc,
+                posts_per_hour=posts_per_hour,
+                listing_status=listing_status,
+            ):
+                posts.append(post)
+                if not post["title"]:
+                    continue
+                page_content = "\n".join((post["title"], post["selftext"] or ""))
+                if page_content.strip():
+                    yield Document(
+                        page_content=page_content,
+                        metadata=metadata_base | {"source": post["permalink"]},
+                    )
 
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(vector_store.add_documents(documents))
-            logger.info("Documents added to vector store successfully")
+            logger.info(f"Streaming r/{subreddit_name} posts into vector store...")
+            added = await vector_store.add_documents_from_stream(documents())
         finally:
-            loop.close()
+            await scraper.close()
 
-        final_count = vector_store.get_document_count()
-        logger.info(f"Final document count in vector store: {final_count}")
-        logger.info(f"Documents added: {final_count - initial_count}")
+        logger.info(
+            f"Retrieved {len(posts)} posts from r/{subreddit_name}, added {added} new documents"
+        )
 
         if posts:
-            output_file = scraper.save_posts_to_json(
+            output_file = await asyncio.to_thread(
+                scraper.save_posts_to_json,
                 posts,
-                filename=f"{timestamp}.json",
+                filename=f"{timestamp}.json.zst",
                 subreddit_name=subreddit_name,
                 hours=hours,
             )
@@ -193,6 +246,14 @@ def main(subreddit_name: str, hours: int):
             logger.info(f"No posts found in the last {hours} hours.")
 
         logger.info(f"=== Successfully completed processing r/{subreddit_name} ===")
+        if not listing_status.get("complete"):
+            # Posts between the limit and the old mark were never listed, so
+            # advancing the mark would skip them for good
+            logger.warning(
+                f"Keeping the r/{subreddit_name} high-water mark at {since_utc}"
+            )
+            return since_utc
+        return max((post["created_utc"] for post in posts), default=since_utc)
 
     except Exception as e:
         logger.error(f"=== Error processing r/{subreddit_name}: {e} ===")
@@ -202,21 +263,42 @@ def main(subreddit_name: str, hours: int):
         raise
 
 
-if __name__ == "__main__":
-    logger.info(f"Starting to process {len(REDDIT_PULL_CONFIG)} subreddits")
+async def run_all(configs: List[Dict[str, Any]]) -> None:
+    logger.info(f"Starting to process {len(configs)} subreddits")
 
-    for i, config in enumerate(REDDIT_PULL_CONFIG, 1):
-        logger.info(
-            f"=== Processing subreddit {i}/{len(REDDIT_PULL_CONFIG)}: {config['subreddit_name']} ==="
-        )
-        try:
-            main(config["subreddit_name"], config["hours"])
-            if i < len(REDDIT_PULL_CONFIG):
-                logger.info("Waiting 3 seconds before next subreddit...")
-                sleep(3)
-        except Exception as e:
-            logger.error(f"=== Failed to process r/{config['subreddit_name']}: {e} ===")
-            logger.error("Continuing with next subreddit...")
-            continue
+    logger.info("Initializing vector store...")
+    vector_store = get_vector_store(VECTOR_STORE_CONFIG)
+    logger.info("Vector store initialized successfully")
+
+    initial_count = vector_store.get_document_count()
+    logger.info(f"Initial document count in vector store: {initial_count}")
+
+    highwater = load_highwater()
+    results = await asyncio.gather(
+        *(
+            main(
+                config["subreddit_name"],
+                config["hours"],
+                highwater.get(config["subreddit_name"], 0),
+                config.get("posts_per_hour"),
+            )
+            for config in configs
+        ),
+        return_exceptions=True,
+    )
+    for config, result in zip(configs, results):
+        if isinstance(result, Exception):
+            logger.error(f"=== Failed to process r/{config['subreddit_name']}: {result} ===")
+        else:
+            highwater[config["subreddit_name"]] = result
+    save_highwater(highwater)
+
+    final_count = vector_store.get_document_count()
+    logger.info(f"Final document count in vector store: {final_count}")
+    logger.info(f"Documents added: {final_count - initial_count}")
 
     logger.info("=== Finished processing all subreddits ===")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_all(REDDIT_PULL_CONFIG))
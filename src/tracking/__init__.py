@@ -1,11 +1,50 @@
-from .mlflow_config import MLflowConfig, get_mlflow_config, DEFAULT_MLFLOW_CONFIG
-from .retriever_tracker import RetrieverTracker
-from .advisor_tracker import AdvisorTracker
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .advisor_tracker import AdvisorTracker
+    from .async_logger import mlflow_worker
+    from .mlflow_config import (
+        MLflowConfig,
+        ensure_experiment,
+        get_client,
+        get_mlflow,
+        get_mlflow_config,
+        DEFAULT_MLFLOW_CONFIG,
+    )
+    from .retriever_tracker import RetrieverTracker
+
+_LAZY_ATTRIBUTES = {
+    "MLflowConfig": ".mlflow_config",
+    "get_mlflow_config": ".mlflow_config",
+    "get_client": ".mlflow_config",
+    "get_mlflow": ".mlflow_config",
+    "ensure_experiment": ".mlflow_config",
+    "DEFAULT_MLFLOW_CONFIG": ".mlflow_config",
+    "RetrieverTracker": ".retriever_tracker",
+    "AdvisorTracker": ".advisor_tracker",
+    "mlflow_worker": ".async_logger",
+}
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "MLflowConfig",
     "get_mlflow_config",
+    "get_client",
+    "get_mlflow",
+    "ensure_experiment",
     "DEFAULT_MLFLOW_CONFIG",
     "RetrieverTracker",
     "AdvisorTracker",
+    "mlflow_worker",
 ]
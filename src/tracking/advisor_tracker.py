@@ -1,13 +1,22 @@
-import os
-import json
-import tempfile
+import re
+import time
 from datetime import datetime
-from typing import Dict, Any, List, Optional
-
-import mlflow
-from mlflow.tracking import MlflowClient
-
-from .mlflow_config import get_mlflow_config, MLflowConfig
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from .async_logger import MetricBuffer, mlflow_worker
+from .mlflow_config import (
+    PRETTY_JSON_ARTIFACTS,
+    ensure_experiment,
+    get_client,
+    get_mlflow,
+    get_mlflow_config,
+    MLflowConfig,
+)
+from .stats import summary_stats
 from api.services.config import (
     SYSTEM_PROMPT,
     MODEL_NAME,
@@ -19,35 +28,51 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+ADVISOR_TRACKING_ENABLED = os.getenv("ADVISOR_TRACKING", "1") != "0"
+JSON_ARTIFACT_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+if PRETTY_JSON_ARTIFACTS:
+    JSON_ARTIFACT_OPTIONS |= orjson.OPT_INDENT_2
+
+_ADVISOR_CONFIG = {
+    "model_name": MODEL_NAME,
+    "retriever_k": RETRIEVER_K,
+    "relevant_documents_top_k": RELEVANT_DOCUMENTS_TOP_K,
+    "max_tokens": MAX_TOKENS,
+}
+_ADVISOR_CONFIG_JSON = orjson.dumps(_ADVISOR_CONFIG, option=JSON_ARTIFACT_OPTIONS).decode()
+
+MAX_TEXT_ARTIFACT_CHARS = 1_000_000
+RELEVANT_DOCUMENT_LOG_CHARS = 4096
+
+_RECOMMENDATION_RE = re.compile(r"recommend|suggest|consider|advise", re.IGNORECASE)
+
 
 class AdvisorTracker:
     def __init__(self, config: Optional[MLflowConfig] = None):
         self.config = config or get_mlflow_config()
-        try:
-            self.client = MlflowClient(tracking_uri=self.config.tracking_uri)
-            self._setup_experiment()
-            self.current_run = None
-        except Exception:
+        self._stock_steps: Dict[str, int] = {}
+        self._stock_steps_run_id: Optional[str] = None
+        if not ADVISOR_TRACKING_ENABLED:
             self.client = None
             self.current_run = None
+            return
 
-    def _setup_experiment(self):
         try:
-            mlflow.set_tracking_uri(self.config.tracking_uri)
-
-            experiment = self.client.get_experiment_by_name(self.config.experiment_name)
-            if experiment is None:
-                experiment_id = self.client.create_experiment(
-                    self.config.experiment_name,
-                    artifact_location=self.config.artifact_location,
-                )
-            else:
-                experiment_id = experiment.experiment_id
-
-            mlflow.set_experiment(self.config.experiment_name)
-            return experiment_id
+            self.client = get_client(
+                self.config.tracking_uri,
+                self.config.experiment_name,
+                self.config.artifact_location,
+            )
+            self.experiment_id = ensure_experiment(
+                self.config.tracking_uri,
+                self.config.experiment_name,
+                self.config.artifact_location,
+            )
+            self._buffer = MetricBuffer(self.client)
+            self.current_run = None
         except Exception:
-            return None
+            self.client = None
+            self.current_run = None
 
     def start_run(self, run_name: str, nested: bool = False) -> Optional[str]:
         """Start a new MLflow run"""
@@ -55,10 +80,12 @@ class AdvisorTracker:
             return None
 
         try:
+            mlflow = get_mlflow()
             if nested:
                 run = mlflow.start_run(nested=True)
             else:
                 run = mlflow.start_run(run_name=run_name)
+            self._reset_stock_steps()
             return run.info.run_id
         except Exception:
             return None
@@ -67,32 +94,71 @@ class AdvisorTracker:
         if self.client is None:
             return
 
+        mlflow_worker.flush()
         if self.current_run is not None:
-            mlflow.end_run()
+            get_mlflow().end_run()
             self.current_run = None
+        self._reset_stock_steps()
+
+    def _reset_stock_steps(self):
+        self._stock_steps = {}
+        self._stock_steps_run_id = None
+
+    def _active_run_id(self) -> str:
+        mlflow = get_mlflow()
+        run = mlflow.active_run() or mlflow.start_run()
+        return run.info.run_id
+
+    def _log_batch(
+        self,
+        metrics: Optional[Dict[str, float]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        tags: Optional[Dict[str, Any]] = None,
+    ):
+        from mlflow.entities import Metric, Param, RunTag
+
+        timestamp = time.time_ns() // 1_000_000
+        self._buffer.add(
+            self._active_run_id(),
+            metrics=[
+                Metric(key, value, timestamp, 0) for key, value in (metrics or {}).items()
+            ],
+            params=[Param(key, str(value)) for key, value in (params or {}).items()],
+            tags=[RunTag(key, str(value)) for key, value in (tags or {}).items()],
+        )
+
+    def _log_text(self, text: str, artifact_file: str):
+        run_id = self._active_run_id()
+        if len(text) <= MAX_TEXT_ARTIFACT_CHARS:
+            mlflow_worker.submit(self.client.log_text, run_id, text, artifact_file)
+            return
+
+        stem, dot, suffix = artifact_file.rpartition(".")
+        if not dot:
+            stem, suffix = artifact_file, "txt"
+        for part, start in enumerate(range(0, len(text), MAX_TEXT_ARTIFACT_CHARS)):
+            mlflow_worker.submit(
+                self.client.log_text,
+                run_id,
+                text[start : start + MAX_TEXT_ARTIFACT_CHARS],
+                f"{stem}.part{part}.{suffix}",
+            )
+
+    def _log_json_artifact(self, data: Any, artifact_file: str):
+        self._log_text(
+            orjson.dumps(data, default=str, option=JSON_ARTIFACT_OPTIONS).decode(), artifact_file
+        )
 
     def log_advisor_config(self):
         if self.client is None:
             return
 
         try:
-            config_params = {
-                "model_name": MODEL_NAME,
-                "retriever_k": RETRIEVER_K,
-                "relevant_documents_top_k": RELEVANT_DOCUMENTS_TOP_K,
-                "max_tokens": MAX_TOKENS,
-            }
-
-            mlflow.log_params(config_params)
+            self._log_batch(params=_ADVISOR_CONFIG)
 
-            mlflow.log_text(SYSTEM_PROMPT, "system_prompt.txt")
+            self._log_text(SYSTEM_PROMPT, "system_prompt.txt")
 
-            with tempfile.NamedTemporaryFile(
-                mode="w", suffix=".json", delete=False
-            ) as f:
-                json.dump(config_params, f, indent=2)
-                mlflow.log_artifact(f.name, "advisor_config.json")
-                os.unlink(f.name)
+            self._log_text(_ADVISOR_CONFIG_JSON, "advisor_config.json")
         except Exception as e:
             logger.error(f"Error logging portfolio context: {e}")
             pass
@@ -101,31 +167,28 @@ class AdvisorTracker:
         self,
         user_id: int,
         holdings: List[Dict[str, Any]],
-        relevant_documents: List[str],
+        relevant_documents: List[tuple],
         processing_time: float,
     ):
         if self.client is None:
             return
 
         try:
-            mlflow.log_params(
-                {
-                    "user_id": user_id,
-                    "holdings_count": len(holdings),
-                    "relevant_documents_count": len(relevant_documents),
-                }
+            document_lengths = np.fromiter(
+                (len(doc.page_content) for doc, _ in relevant_documents),
+                dtype=np.int64,
+                count=len(relevant_documents),
             )
-
-            mlflow.log_metrics(
-                {
+            self._log_batch(
+                metrics={
                     "portfolio_context_processing_time_seconds": processing_time,
                     "avg_document_length": (
-                        sum(len(doc) for doc in relevant_documents)
-                        / len(relevant_documents)
-                        if relevant_documents
-                        else 0
+                        float(document_lengths.mean()) if document_lengths.size else 0.0
                     ),
-                }
+                    "holdings_count": len(holdings),
+                    "relevant_documents_count": len(relevant_documents),
+                },
+                tags={"user_id": user_id},
             )
 
             holdings_summary = []
@@ -137,17 +200,14 @@ class AdvisorTracker:
                     }
                 )
 
-            with tempfile.NamedTemporaryFile(
-                mode="w", suffix=".json", delete=False
-            ) as f:
-                json.dump(holdings_summary, f, indent=2)
-                mlflow.log_artifact(f.name, "holdings_summary.json")
-                os.unlink(f.name)
+            self._log_json_artifact(holdings_summary, "holdings_summary.json")
 
             if relevant_documents:
-                sample_docs = relevant_documents[:3]
-                for i, doc in enumerate(sample_docs):
-                    mlflow.log_text(doc, f"relevant_document_{i}.txt")
+                for i, (doc, _) in enumerate(relevant_documents[:3]):
+                    self._log_text(
+                        doc.page_content[:RELEVANT_DOCUMENT_LOG_CHARS],
+                        f"relevant_document_{i}.txt",
+                    )
         except Exception as e:
             logger.error(f"Error logging advice generation: {e}")
             pass
@@ -163,38 +223,31 @@ class AdvisorTracker:
             return
 
         try:
-            mlflow.log_metrics(
-                {
-                    "advice_generation_time_seconds": generation_time,
-                    "user_prompt_length": len(user_prompt),
-                    "advice_response_length": len(advice_response),
-                }
-            )
-
+            metrics = {
+                "advice_generation_time_seconds": generation_time,
+                "user_prompt_length": len(user_prompt),
+                "advice_response_length": len(advice_response),
+            }
             if token_count:
-                mlflow.log_metric("response_token_count", token_count)
+                metrics["response_token_count"] = token_count
+            self._log_batch(metrics=metrics)
 
-            mlflow.log_text(user_prompt, "user_prompt.txt")
+            self._log_text(user_prompt, "user_prompt.txt")
 
-            mlflow.log_text(advice_response, "advice_response.txt")
+            self._log_text(advice_response, "advice_response.txt")
 
+            prompt_lower = user_prompt.lower()
             prompt_analysis = {
                 "prompt_word_count": len(user_prompt.split()),
-                "prompt_contains_portfolio": "portfolio" in user_prompt.lower(),
-                "prompt_contains_market": "market" in user_prompt.lower(),
+                "prompt_contains_portfolio": "portfolio" in prompt_lower,
+                "prompt_contains_market": "market" in prompt_lower,
                 "response_word_count": len(advice_response.split()),
-                "response_contains_recommendations": any(
-                    word in advice_response.lower()
-                    for word in ["recommend", "suggest", "consider", "advise"]
+                "response_contains_recommendations": bool(
+                    _RECOMMENDATION_RE.search(advice_response)
                 ),
             }
 
-            with tempfile.NamedTemporaryFile(
-                mode="w", suffix=".json", delete=False
-            ) as f:
-                json.dump(prompt_analysis, f, indent=2)
-                mlflow.log_artifact(f.name, "prompt_analysis.json")
-                os.unlink(f.name)
+            self._log_json_artifact(prompt_analysis, "prompt_analysis.json")
 
         except Exception as e:
             logger.error(f"Error logging vector store search: {e}")
@@ -211,34 +264,71 @@ class AdvisorTracker:
             return
 
         try:
-            mlflow.log_params(
-                {
-                    f"search_stock_{stock}": stock,
-                    f"search_query_length_{stock}": len(enhanced_query),
-                    f"search_results_count_{stock}": len(search_results),
-                }
+            self._log_vector_store_searches(
+                {stock: (enhanced_query, search_results, search_time)}
             )
 
-            mlflow.log_metrics(
-                {
-                    f"vector_search_time_seconds_{stock}": search_time,
-                }
-            )
+            self._log_text(enhanced_query, f"search_query_{stock}.txt")
+        except Exception as e:
+            logger.error(f"Error logging error: {e}")
+            pass
+
+    def log_vector_store_search_batch(
+        self, per_stock: Dict[str, Tuple[str, List[tuple], float]]
+    ):
+        if self.client is None or not per_stock:
+            return
+
+        try:
+            self._log_vector_store_searches(per_stock)
 
-            mlflow.log_text(enhanced_query, f"search_query_{stock}.txt")
+            self._log_json_artifact(
+                {stock: enhanced_query for stock, (enhanced_query, _, _) in per_stock.items()},
+                "search_queries.json",
+            )
+        except Exception as e:
+            logger.error(f"Error logging vector store search batch: {e}")
 
+    def _log_vector_store_searches(
+        self, per_stock: Dict[str, Tuple[str, List[tuple], float]]
+    ):
+        from mlflow.entities import Metric, RunTag
+
+        run_id = self._active_run_id()
+        if run_id != self._stock_steps_run_id:
+            # Steps are numbered per run, so a new run starts a new map
+            self._stock_steps = {}
+            self._stock_steps_run_id = run_id
+
+        timestamp = time.time_ns() // 1_000_000
+        metrics = []
+        tags = []
+        for stock, (enhanced_query, search_results, search_time) in per_stock.items():
+            step = self._stock_steps.get(stock)
+            if step is None:
+                step = self._stock_steps[stock] = len(self._stock_steps)
+                tags.append(RunTag(f"stock_step_{step}", stock))
+            stock_metrics = {
+                "vector_search_time_seconds": search_time,
+                "search_query_length": len(enhanced_query),
+                "search_results_count": len(search_results),
+            }
             if search_results:
-                scores = [score for _, score in search_results]
-                mlflow.log_metrics(
+                avg_score, min_score, max_score = summary_stats(
+                    score for _, score in search_results
+                )
+                stock_metrics.update(
                     {
-                        f"search_score_avg_{stock}": sum(scores) / len(scores),
-                        f"search_score_max_{stock}": max(scores),
-                        f"search_score_min_{stock}": min(scores),
+                        "search_score_avg": avg_score,
+                        "search_score_max": max_score,
+                        "search_score_min": min_score,
                     }
                 )
-        except Exception as e:
-            logger.error(f"Error logging error: {e}")
-            pass
+            metrics.extend(
+                Metric(key, value, timestamp, step) for key, value in stock_metrics.items()
+            )
+
+        self._buffer.add(run_id, metrics=metrics, params=[], tags=tags)
 
     def log_error(
         self, error: Exception, context: str = "", user_id: Optional[int] = None
@@ -255,20 +345,17 @@ class AdvisorTracker:
                 "timestamp": datetime.now().isoformat(),
             }
 
-            with tempfile.NamedTemporaryFile(
-                mode="w", suffix=".json", delete=False
-            ) as f:
-                json.dump(error_info, f, indent=2)
-                mlflow.log_artifact(f.name, "advisor_error_log.json")
-                os.unlink(f.name)
-
-            mlflow.log_param("error_occurred", True)
-            mlflow.log_param(
-                f"error_type_{context}_{datetime.now().timestamp()}",
-                error_info["error_type"],
-            )
+            self._log_json_artifact(error_info, "advisor_error_log.json")
+
+            error_tags = {
+                "error_occurred": True,
+                "last_error_type": error_info["error_type"],
+                "last_error_context": context,
+                "last_error_at": error_info["timestamp"],
+            }
             if user_id:
-                mlflow.log_param("error_user_id", user_id)
+                error_tags["last_error_user_id"] = user_id
+            self._log_batch(tags=error_tags)
         except Exception as e:
             logger.error(f"Error logging error: {e}")
             pass
@@ -277,7 +364,7 @@ class AdvisorTracker:
         if self.client is None:
             return
         try:
-            mlflow.log_metrics(metrics)
+            self._log_batch(metrics=metrics)
         except Exception as e:
             logger.error(f"Error logging metrics: {e}")
             pass
@@ -286,7 +373,7 @@ class AdvisorTracker:
         if self.client is None:
             return
         try:
-            mlflow.log_params(params)
+            self._log_batch(params=params)
         except Exception as e:
             logger.error(f"Error logging params: {e}")
             pass
@@ -0,0 +1,193 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from mlflow.entities import Metric, Param, RunTag
+
+logger = logging.getLogger(__name__)
+
+MLFLOW_QUEUE_MAX_SIZE = 10000
+MLFLOW_FLUSH_INTERVAL_SECONDS = 5.0
+MLFLOW_FLUSH_TIMEOUT_SECONDS = 10.0
+MLFLOW_BATCH_MAX_ENTITIES = 1000
+MLFLOW_BATCH_MAX_PARAMS = 100
+MLFLOW_BATCH_MAX_TAGS = 100
+MLFLOW_LOGGED_PARAM_RUNS = 1024
+
+
+class _AsyncMlflowWorker:
+    def __init__(self, maxsize: int = MLFLOW_QUEUE_MAX_SIZE):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._buffers: "weakref.WeakSet[MetricBuffer]" = weakref.WeakSet()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="mlflow-logger", daemon=True
+                )
+                self._thread.start()
+
+    def register_buffer(self, buffer: "MetricBuffer"):
+        self._buffers.add(buffer)
+        self._ensure_started()
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+        except queue.Full:
+            logger.warning(f"MLflow logging queue is full, dropping {fn.__name__} call")
+
+    def flush(self, timeout: float = MLFLOW_FLUSH_TIMEOUT_SECONDS) -> bool:
+        for buffer in list(self._buffers):
+            buffer.flush()
+        if self._thread is None:
+            return True
+
+        # Queue.join() has no timeout, and a hung tracking server must not
+        # block end_run or interpreter exit
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(
+                        f"Timed out flushing MLflow logging queue with "
+                        f"{self._queue.unfinished_tasks} pending calls"
+                    )
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                fn, args, kwargs = self._queue.get(timeout=MLFLOW_FLUSH_INTERVAL_SECONDS)
+            except queue.Empty:
+                for buffer in list(self._buffers):
+                    buffer.flush_if_due()
+                continue
+
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error in background MLflow logging: {e}")
+            finally:
+                self._queue.task_done()
+
+
+mlflow_worker = _AsyncMlflowWorker()
+atexit.register(mlflow_worker.flush)
+
+
+class MetricBuffer:
+    def __init__(
+        self,
+        client,
+        flush_interval: float = MLFLOW_FLUSH_INTERVAL_SECONDS,
+        max_entities: int = MLFLOW_BATCH_MAX_ENTITIES,
+    ):
+        self._client = client
+        self._flush_interval = flush_interval
+        self._max_entities = max_entities
+        self._lock = threading.Lock()
+        self._pending: Dict[
+            str, Tuple[List["Metric"], Dict[str, "Param"], Dict[str, "RunTag"]]
+        ] = {}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        # Params are immutable in MLflow, so remember what each run already has
+        # and never resend or overwrite it
+        self._logged_params: Dict[str, Dict[str, str]] = {}
+        mlflow_worker.register_buffer(self)
+
+    def add(
+        self,
+        run_id: str,
+        metrics: List["Metric"],
+        params: List["Param"],
+        tags: Sequence["RunTag"] = (),
+    ):
+        with self._lock:
+            run_metrics, run_params, run_tags = self._pending.setdefault(
+                run_id, ([], {}, {})
+            )
+            run_metrics.extend(metrics)
+            logged_params = self._logged_params.get(run_id)
+            if logged_params is None:
+                if len(self._logged_params) >= MLFLOW_LOGGED_PARAM_RUNS:
+                    self._logged_params.pop(next(iter(self._logged_params)))
+                logged_params = self._logged_params[run_id] = {}
+            new_params = 0
+            for param in params:
+                logged_value = logged_params.get(param.key)
+                if logged_value is None:
+                    logged_params[param.key] = param.value
+                    run_params[param.key] = param
+                    new_params += 1
+                elif logged_value != param.value:
+                    logger.warning(
+                        f"Ignoring new value for MLflow param {param.key} on run {run_id}: "
+                        f"params cannot be changed once logged"
+                    )
+            for tag in tags:
+                run_tags[tag.key] = tag
+            self._pending_count += len(metrics) + new_params + len(tags)
+            due = self._is_due()
+
+        if due:
+            self.flush()
+
+    def _is_due(self) -> bool:
+        return (
+            self._pending_count >= self._max_entities
+            or time.monotonic() - self._last_flush >= self._flush_interval
+        )
+
+    def flush_if_due(self):
+        with self._lock:
+            due = bool(self._pending) and self._is_due()
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._pending_count = 0
+            self._last_flush = time.monotonic()
+
+        for run_id, (metrics, params, tags) in pending.items():
+            # Params go in their own batches so a rejected param cannot take
+            # the run's metrics and tags down with it
+            params = list(params.values())
+            for start in range(0, len(params), MLFLOW_BATCH_MAX_PARAMS):
+                mlflow_worker.submit(
+                    self._client.log_batch,
+                    run_id,
+                    params=params[start : start + MLFLOW_BATCH_MAX_PARAMS],
+                )
+
+            tags = list(tags.values())
+            while metrics or tags:
+                batch_tags = tags[:MLFLOW_BATCH_MAX_TAGS]
+                tags = tags[MLFLOW_BATCH_MAX_TAGS:]
+                metric_room = MLFLOW_BATCH_MAX_ENTITIES - len(batch_tags)
+                batch_metrics, metrics = metrics[:metric_room], metrics[metric_room:]
+                mlflow_worker.submit(
+                    self._client.log_batch,
+                    run_id,
+                    metrics=batch_metrics,
+                    tags=batch_tags,
+                )
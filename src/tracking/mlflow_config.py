@@ -1,9 +1,24 @@
+import logging
 import os
-from typing import Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 from dataclasses import dataclass
 
+if TYPE_CHECKING:
+    from types import ModuleType
+
+    from mlflow.tracking import MlflowClient
+
+logger = logging.getLogger(__name__)
+
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+os.environ.setdefault("MLFLOW_HTTP_POOL_CONNECTIONS", "4")
+os.environ.setdefault("MLFLOW_HTTP_POOL_MAXSIZE", "16")
+os.environ.setdefault("MLFLOW_HTTP_REQUEST_MAX_RETRIES", "3")
+
+PRETTY_JSON_ARTIFACTS = os.getenv("MLFLOW_PRETTY_JSON", "0") == "1"
+
 
 @dataclass
 class MLflowConfig:
@@ -11,6 +26,7 @@ class MLflowConfig:
     experiment_name: str = "finance-agent"
     artifact_location: str = PROJECT_ROOT + "/mlflow_artifacts"
     run_name: Optional[str] = None
+    max_artifact_bytes: int = 1024**3
 
     def __post_init__(self):
         os.makedirs(self.artifact_location, exist_ok=True)
@@ -31,4 +47,59 @@ def get_mlflow_config() -> MLflowConfig:
     if os.getenv("MLFLOW_ARTIFACT_LOCATION"):
         config.artifact_location = os.getenv("MLFLOW_ARTIFACT_LOCATION")
 
+    if os.getenv("MLFLOW_MAX_ARTIFACT_BYTES"):
+        config.max_artifact_bytes = int(os.getenv("MLFLOW_MAX_ARTIFACT_BYTES"))
+
     return config
+
+
+@lru_cache(maxsize=1)
+def get_mlflow() -> "ModuleType":
+    import mlflow
+
+    return mlflow
+
+
+@lru_cache(maxsize=4)
+def get_client(
+    tracking_uri: str, experiment_name: str, artifact_location: Optional[str] = None
+) -> "MlflowClient":
+    from mlflow.tracking import MlflowClient
+
+    client = MlflowClient(tracking_uri=tracking_uri)
+    ensure_experiment(tracking_uri, experiment_name, artifact_location)
+    return client
+
+
+@lru_cache(maxsize=None)
+def _ensure_experiment(
+    tracking_uri: str, experiment_name: str, artifact_location: Optional[str] = None
+) -> str:
+    from mlflow.tracking import MlflowClient
+
+    mlflow = get_mlflow()
+    mlflow.set_tracking_uri(tracking_uri)
+
+    client = MlflowClient(tracking_uri=tracking_uri)
+    experiment = client.get_experiment_by_name(experiment_name)
+    if experiment is None:
+        experiment_id = client.create_experiment(
+            experiment_name, artifact_location=artifact_location
+        )
+    else:
+        experiment_id = experiment.experiment_id
+
+    mlflow.set_experiment(experiment_name)
+    return experiment_id
+
+
+def ensure_experiment(
+    tracking_uri: str, experiment_name: str, artifact_location: Optional[str] = None
+) -> Optional[str]:
+    # Only successful lookups are cached, so a tracking server that is down at
+    # first use is retried on the next call instead of disabling tracking
+    try:
+        return _ensure_experiment(tracking_uri, experiment_name, artifact_location)
+    except Exception as e:
+        logger.warning(f"Could not set up MLflow experiment {experiment_name}: {e}")
+        return None
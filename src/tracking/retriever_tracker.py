@@ -1,47 +1,82 @@
 import os
-import json
+import tarfile
 import tempfile
+import time
 import logging
 from datetime import datetime
+from itertools import islice
 from typing import Dict, Any, List, Optional
 
-import mlflow
-from mlflow.tracking import MlflowClient
+import numpy as np
+import orjson
 from langchain_core.documents import Document
 
-from .mlflow_config import get_mlflow_config, MLflowConfig
+from .async_logger import MetricBuffer, mlflow_worker
+from .mlflow_config import (
+    PRETTY_JSON_ARTIFACTS,
+    ensure_experiment,
+    get_client,
+    get_mlflow,
+    get_mlflow_config,
+    MLflowConfig,
+)
+from .stats import summary_stats
 
 logger = logging.getLogger(__name__)
 
+MIN_FILES_TO_ARCHIVE = 4
+RETRIEVER_TRACKING_ENABLED = os.getenv("RETRIEVER_TRACKING", "1") != "0"
+JSON_ARTIFACT_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+if PRETTY_JSON_ARTIFACTS:
+    JSON_ARTIFACT_OPTIONS |= orjson.OPT_INDENT_2
+
+
+def _directory_size(directory: str, limit: int) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+            if total > limit:
+                return total
+    return total
+
+
+def _count_files(directory: str, limit: int) -> int:
+    count = 0
+    for _, _, files in os.walk(directory):
+        count += len(files)
+        if count >= limit:
+            break
+    return count
+
 
 class RetrieverTracker:
     def __init__(self, config: Optional[MLflowConfig] = None):
         self.config = config or get_mlflow_config()
-        try:
-            self.client = MlflowClient(tracking_uri=self.config.tracking_uri)
-            self._setup_experiment()
-            self.current_run = None
-        except Exception:
+        if not RETRIEVER_TRACKING_ENABLED:
             self.client = None
             self.current_run = None
+            return
 
-    def _setup_experiment(self):
         try:
-            mlflow.set_tracking_uri(self.config.tracking_uri)
-
-            experiment = self.client.get_experiment_by_name(self.config.experiment_name)
-            if experiment is None:
-                experiment_id = self.client.create_experiment(
-                    self.config.experiment_name,
-                    artifact_location=self.config.artifact_location,
-                )
-            else:
-                experiment_id = experiment.experiment_id
-
-            mlflow.set_experiment(self.config.experiment_name)
-            return experiment_id
+            self.client = get_client(
+                self.config.tracking_uri,
+                self.config.experiment_name,
+                self.config.artifact_location,
+            )
+            self.experiment_id = ensure_experiment(
+                self.config.tracking_uri,
+                self.config.experiment_name,
+                self.config.artifact_location,
+            )
+            self._buffer = MetricBuffer(self.client)
+            self.current_run = None
         except Exception:
-            return None
+            self.client = None
+            self.current_run = None
 
     def start_run(
         self,
@@ -53,16 +88,15 @@ class RetrieverTracker:
             return None
 
         # Don't end existing runs if we're starting a nested run
+        mlflow = get_mlflow()
         if self.current_run is not None and not nested:
+            mlflow_worker.flush()
             mlflow.end_run()
 
-        run_name = (
-            run_name
-            or self.config.run_name
-            or f"retriever-run-{datetime.now().isoformat()}"
-        )
+        started_at = datetime.now().isoformat()
+        run_name = run_name or self.config.run_name or f"retriever-run-{started_at}"
         tags = tags or {}
-        tags.update({"component": "retriever", "timestamp": datetime.now().isoformat()})
+        tags.update({"component": "retriever", "timestamp": started_at})
 
         try:
             self.current_run = mlflow.start_run(
@@ -77,13 +111,55 @@ class RetrieverTracker:
         if self.client is None:
             return
 
+        mlflow_worker.flush()
         if self.current_run is not None:
-            mlflow.end_run()
+            get_mlflow().end_run()
             self.current_run = None
 
+    def _active_run_id(self) -> str:
+        mlflow = get_mlflow()
+        run = mlflow.active_run() or mlflow.start_run()
+        return run.info.run_id
+
+    def _log_batch(
+        self,
+        metrics: Optional[Dict[str, float]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        tags: Optional[Dict[str, Any]] = None,
+    ):
+        if self.client is None:
+            return
+
+        from mlflow.entities import Metric, Param, RunTag
+
+        timestamp = time.time_ns() // 1_000_000
+        self._buffer.add(
+            self._active_run_id(),
+            metrics=[
+                Metric(key, value, timestamp, 0) for key, value in (metrics or {}).items()
+            ],
+            params=[Param(key, str(value)) for key, value in (params or {}).items()],
+            tags=[RunTag(key, str(value)) for key, value in (tags or {}).items()],
+        )
+
+    def _log_text(self, text: str, artifact_file: str):
+        if self.client is None:
+            return
+
+        mlflow_worker.submit(self.client.log_text, self._active_run_id(), text, artifact_file)
+
+    def _log_json_artifact(self, data: Any, artifact_file: str):
+        self._log_text(
+            orjson.dumps(data, default=str, option=JSON_ARTIFACT_OPTIONS).decode(),
+            artifact_file,
+        )
+
     def log_vector_store_config(self, config: Dict[str, Any]):
-        mlflow.log_params(
-            {
+        if self.client is None:
+            return
+
+        self._log_batch(
+            params={
                 "collection_name": config.get("collection_name"),
                 "chunk_size": config.get("chunk_size"),
                 "chunk_overlap": config.get("chunk_overlap"),
@@ -92,14 +168,14 @@ class RetrieverTracker:
             }
         )
 
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-            json.dump(config, f, indent=2, default=str)
-            mlflow.log_artifact(f.name, "vector_store_config.json")
-            os.unlink(f.name)
+        self._log_json_artifact(config, "vector_store_config.json")
 
     def log_embedder_config(self, config: Dict[str, Any]):
-        mlflow.log_params(
-            {
+        if self.client is None:
+            return
+
+        self._log_batch(
+            params={
                 "embedder_model": config.get("model_name"),
                 "embedder_device": config.get("model_kwargs", {}).get("device"),
                 "embedder_batch_size": config.get("encode_kwargs", {}).get(
@@ -111,10 +187,7 @@ class RetrieverTracker:
             }
         )
 
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-            json.dump(config, f, indent=2, default=str)
-            mlflow.log_artifact(f.name, "embedder_config.json")
-            os.unlink(f.name)
+        self._log_json_artifact(config, "embedder_config.json")
 
     def log_document_processing_metrics(
         self,
@@ -123,21 +196,23 @@ class RetrieverTracker:
         processing_time: float,
         chunk_sizes: List[int],
     ):
-        mlflow.log_metrics(
-            {
-                "total_documents": total_documents,
-                "total_chunks": total_chunks,
-                "processing_time_seconds": processing_time,
-                "avg_chunk_size": sum(chunk_sizes) / len(chunk_sizes)
-                if chunk_sizes
-                else 0,
-                "min_chunk_size": min(chunk_sizes) if chunk_sizes else 0,
-                "max_chunk_size": max(chunk_sizes) if chunk_sizes else 0,
-            }
+        if self.client is None:
+            return
+
+        sizes = np.asarray(chunk_sizes, dtype=np.int64)
+        metrics = {
+            "total_documents": total_documents,
+            "total_chunks": total_chunks,
+            "processing_time_seconds": processing_time,
+            "avg_chunk_size": float(sizes.mean()) if sizes.size else 0,
+            "min_chunk_size": int(sizes.min()) if sizes.size else 0,
+            "max_chunk_size": int(sizes.max()) if sizes.size else 0,
+        }
+        metrics.update(
+            (f"chunk_size_{i}", size) for i, size in enumerate(islice(chunk_sizes, 10))
         )
 
-        for i, size in enumerate(chunk_sizes[:10]):
-            mlflow.log_metric(f"chunk_size_{i}", size)
+        self._log_batch(metrics=metrics)
 
     def log_search_metrics(
         self,
@@ -147,34 +222,64 @@ class RetrieverTracker:
         results_count: int,
         scores: List[float],
     ):
-        mlflow.log_metrics(
-            {
-                "search_time_seconds": search_time,
-                "results_count": results_count,
-                "avg_score": sum(scores) / len(scores) if scores else 0,
-                "min_score": min(scores) if scores else 0,
-                "max_score": max(scores) if scores else 0,
-            }
-        )
+        if self.client is None:
+            return
 
-        mlflow.log_params(
-            {
-                "search_top_k": top_k,
-                "search_query_length": len(query),
-            }
+        avg_score, min_score, max_score = summary_stats(scores)
+        metrics = {
+            "search_time_seconds": search_time,
+            "results_count": results_count,
+            "avg_score": avg_score,
+            "min_score": min_score,
+            "max_score": max_score,
+            "search_top_k": top_k,
+            "search_query_length": len(query),
+        }
+        metrics.update(
+            (f"search_score_{i}", score) for i, score in enumerate(islice(scores, 10))
         )
 
-        mlflow.log_text(query, "search_query.txt")
+        self._log_batch(metrics=metrics)
 
-        if scores:
-            for i, score in enumerate(scores[:10]):
-                mlflow.log_metric(f"search_score_{i}", score)
+        self._log_text(query, "search_query.txt")
 
     def log_vector_store_artifacts(self, persist_directory: str):
-        if os.path.exists(persist_directory):
-            mlflow.log_artifact(persist_directory, "vector_store")
+        if self.client is None:
+            return
+
+        if os.path.isdir(persist_directory):
+            mlflow_worker.submit(
+                self._upload_directory_archive,
+                self._active_run_id(),
+                persist_directory,
+                "vector_store",
+            )
+
+    def _upload_directory_archive(self, run_id: str, directory: str, artifact_path: str):
+        max_bytes = self.config.max_artifact_bytes
+        if _directory_size(directory, limit=max_bytes) > max_bytes:
+            logger.warning(
+                f"Skipping upload of {directory}: larger than {max_bytes} bytes"
+            )
+            return
+
+        if _count_files(directory, limit=MIN_FILES_TO_ARCHIVE) < MIN_FILES_TO_ARCHIVE:
+            self.client.log_artifact(run_id, directory, artifact_path)
+            return
+
+        with tempfile.NamedTemporaryFile(suffix=".tar.gz", delete=False) as f:
+            with tarfile.open(fileobj=f, mode="w:gz", compresslevel=1) as archive:
+                archive.add(directory, arcname=os.path.basename(os.path.normpath(directory)))
+
+        try:
+            self.client.log_artifact(run_id, f.name, artifact_path)
+        finally:
+            os.unlink(f.name)
 
     def log_sample_documents(self, documents: List[Document], max_samples: int = 10):
+        if self.client is None:
+            return
+
         sample_docs = documents[:max_samples]
 
         doc_summary = []
@@ -184,23 +289,17 @@ class RetrieverTracker:
                     "index": i,
                     "page_content_length": len(doc.page_content),
                     "metadata": doc.metadata,
+                    "page_content": doc.page_content,
                 }
             )
 
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-            json.dump(doc_summary, f, indent=2, default=str)
-            mlflow.log_artifact(f.name, "sample_documents_summary.json")
-            os.unlink(f.name)
-
-        for i, doc in enumerate(sample_docs):
-            content = f"Document {i}:\n{'-' * 50}\n{doc.page_content}\n\nMetadata: {doc.metadata}"
-            mlflow.log_text(content, f"sample_document_{i}.txt")
+        self._log_json_artifact(doc_summary, "sample_documents.json")
 
     def log_metrics(self, metrics: Dict[str, float]):
         if self.client is None:
             return
         try:
-            mlflow.log_metrics(metrics)
+            self._log_batch(metrics=metrics)
         except Exception:
             pass
 
@@ -208,7 +307,7 @@ class RetrieverTracker:
         if self.client is None:
             return
         try:
-            mlflow.log_params(params)
+            self._log_batch(params=params)
         except Exception:
             pass
 
@@ -217,24 +316,23 @@ class RetrieverTracker:
             return
 
         try:
+            now = datetime.now()
             error_info = {
                 "error_type": type(error).__name__,
                 "error_message": str(error),
                 "context": context,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
             }
 
-            with tempfile.NamedTemporaryFile(
-                mode="w", suffix=".json", delete=False
-            ) as f:
-                json.dump(error_info, f, indent=2)
-                mlflow.log_artifact(f.name, "error_log.json")
-                os.unlink(f.name)
-
-            mlflow.log_param("error_occurred", True)
-            mlflow.log_param(
-                f"error_type_{context}_{datetime.now().timestamp()}",
-                error_info["error_type"],
+            self._log_json_artifact(error_info, "error_log.json")
+
+            self._log_batch(
+                tags={
+                    "error_occurred": True,
+                    "last_error_type": error_info["error_type"],
+                    "last_error_context": context,
+                    "last_error_at": error_info["timestamp"],
+                },
             )
         except Exception:
             pass
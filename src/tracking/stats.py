@@ -0,0 +1,19 @@
+from typing import Iterable, Tuple
+
+
+def summary_stats(values: Iterable[float]) -> Tuple[float, float, float]:
+    total = 0.0
+    count = 0
+    minimum = maximum = 0
+    for value in values:
+        if count == 0:
+            minimum = maximum = value
+        elif value < minimum:
+            minimum = value
+        elif value > maximum:
+            maximum = value
+        total += value
+        count += 1
+
+    avg = total / count if count else 0
+    return avg, minimum, maximum
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("supabase")
+pytest.importorskip("numpy")
+
+from api.services.advisor import _top_unique_documents
+from api.services.config import RELEVANT_DOCUMENTS_TOP_K
+
+
+def test_top_unique_documents_keeps_nearest_documents():
+    documents = [
+        (SimpleNamespace(page_content=f"post {i}"), 0.5 - i * 0.01)
+        for i in range(RELEVANT_DOCUMENTS_TOP_K + 3)
+    ]
+    nearest = documents[-1]
+
+    top = _top_unique_documents(documents)
+
+    assert len(top) == RELEVANT_DOCUMENTS_TOP_K
+    assert top[0] == nearest
+    assert [score for _, score in top] == sorted(score for _, score in top)
+
+
+def test_top_unique_documents_drops_duplicate_content():
+    documents = [
+        (SimpleNamespace(page_content="same post"), 0.2),
+        (SimpleNamespace(page_content="same post"), 0.1),
+        (SimpleNamespace(page_content="other post"), 0.3),
+    ]
+
+    top = _top_unique_documents(documents)
+
+    assert [doc.page_content for doc, _ in top] == ["same post", "other post"]
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("orjson")
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("supabase")
+pytest.importorskip("numpy")
+
+import orjson
+
+from api.models.schema import AdviceRequest
+from api.services import advisor as advisor_module
+from api.services.advisor import FinancialAdvisor, stream_advice
+
+
+class _FakeStream:
+    def __init__(self, events, error=None):
+        self._events = list(events)
+        self._error = error
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._events:
+            return self._events.pop(0)
+        if self._error is not None:
+            raise self._error
+        raise StopAsyncIteration
+
+
+def _delta(text):
+    return SimpleNamespace(type="response.output_text.delta", delta=text)
+
+
+def _completed():
+    return SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=None))
+
+
+def _make_advisor(stream):
+    async def create(**kwargs):
+        return stream
+
+    advisor = FinancialAdvisor.__new__(FinancialAdvisor)
+    advisor.openai_client = SimpleNamespace(responses=SimpleNamespace(create=create))
+    advisor.tracker = None
+
+    async def get_user_portfolio_context(user_id):
+        return [{"stock": "AAPL"}], []
+
+    advisor.get_user_portfolio_context = get_user_portfolio_context
+    advisor._build_advice_prompt = lambda holdings, documents: ("prompt", [])
+    return advisor
+
+
+def _collect(advisor):
+    async def run():
+        return [
+            orjson.loads(line)
+            async for line in stream_advice(AdviceRequest(user_id=1), advisor)
+        ]
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def _clear_advice_cache():
+    advisor_module._advice_cache.clear()
+    yield
+    advisor_module._advice_cache.clear()
+
+
+def test_stream_advice_caches_completed_answer():
+    advisor = _make_advisor(_FakeStream([_delta("Buy "), _delta("bonds"), _completed()]))
+
+    lines = _collect(advisor)
+
+    assert [line["delta"] for line in lines if "delta" in line] == ["Buy ", "bonds"]
+    assert not any("error" in line for line in lines)
+    assert [cached.advice for cached in advisor_module._advice_cache.values()] == ["Buy bonds"]
+
+
+def test_stream_advice_does_not_cache_partial_answer():
+    advisor = _make_advisor(_FakeStream([_delta("Buy ")], error=RuntimeError("reset")))
+
+    lines = _collect(advisor)
+
+    assert lines[-1] == {"error": "Advice generation was interrupted"}
+    assert len(advisor_module._advice_cache) == 0
+
+
+def test_stream_advice_does_not_cache_without_completed_event():
+    advisor = _make_advisor(_FakeStream([_delta("Buy ")]))
+
+    lines = _collect(advisor)
+
+    assert not any("error" in line for line in lines)
+    assert len(advisor_module._advice_cache) == 0
@@ -0,0 +1,56 @@
+import time
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("jose")
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+from jose import jwt
+
+from api.auth import jwt_handler
+from api.auth.jwt_handler import create_access_token, verify_token
+
+
+@pytest.fixture(autouse=True)
+def _clear_token_cache():
+    jwt_handler._token_cache.clear()
+    yield
+    jwt_handler._token_cache.clear()
+
+
+def test_verify_token_caches_valid_token():
+    token = create_access_token({"user_id": 1, "username": "alice"})
+
+    assert verify_token(token)["user_id"] == 1
+    assert jwt_handler._token_cache_key(token) in jwt_handler._token_cache
+    assert verify_token(token)["username"] == "alice"
+
+
+def test_expired_token_is_rejected_while_still_cached():
+    token = create_access_token(
+        {"user_id": 1, "username": "alice"}, expires_delta=timedelta(seconds=1)
+    )
+    payload = verify_token(token)
+
+    # The cache entry outlives the token: JWT_CACHE_TTL is longer than one second
+    time.sleep(max(0.0, payload["exp"] - time.time()) + 1.1)
+    assert jwt_handler._token_cache_key(token) in jwt_handler._token_cache
+
+    with pytest.raises(HTTPException) as exc_info:
+        verify_token(token)
+    assert exc_info.value.status_code == 401
+
+
+def test_token_signed_with_other_key_does_not_hit_cache():
+    claims = {"user_id": 1, "username": "alice", "type": "access"}
+    token = jwt.encode(claims, jwt_handler.SECRET_KEY, algorithm=jwt_handler.ALGORITHM)
+    verify_token(token)
+
+    forged = jwt.encode(claims, "another-secret", algorithm=jwt_handler.ALGORITHM)
+
+    with pytest.raises(HTTPException) as exc_info:
+        verify_token(forged)
+    assert exc_info.value.status_code == 401
+    assert jwt_handler._token_cache_key(forged) not in jwt_handler._token_cache
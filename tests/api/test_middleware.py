@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("httpx")
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from api.middleware import PreflightMiddleware
+
+ALLOWED_ORIGIN = "http://localhost:3000"
+
+
+async def _fallthrough(request):
+    return PlainTextResponse("fallthrough")
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[Route("/advice", _fallthrough, methods=["OPTIONS", "POST"])])
+    app.add_middleware(
+        PreflightMiddleware,
+        allow_origins=[ALLOWED_ORIGIN],
+        allow_methods=["GET", "POST"],
+        allow_credentials=True,
+    )
+    return TestClient(app)
+
+
+def test_preflight_from_allowed_origin_is_answered(client):
+    response = client.options(
+        "/advice",
+        headers={"Origin": ALLOWED_ORIGIN, "Access-Control-Request-Method": "POST"},
+    )
+
+    assert response.status_code == 204
+    assert response.headers["access-control-allow-origin"] == ALLOWED_ORIGIN
+    assert response.headers["access-control-allow-methods"] == "GET, POST"
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["vary"] == "Origin"
+    assert "access-control-allow-headers" not in response.headers
+
+
+def test_preflight_from_disallowed_origin_falls_through(client):
+    response = client.options(
+        "/advice",
+        headers={"Origin": "http://evil.example", "Access-Control-Request-Method": "POST"},
+    )
+
+    assert response.text == "fallthrough"
+    assert "access-control-allow-origin" not in response.headers
+
+
+def test_preflight_echoes_requested_headers(client):
+    response = client.options(
+        "/advice",
+        headers={
+            "Origin": ALLOWED_ORIGIN,
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "authorization, content-type",
+        },
+    )
+
+    assert response.status_code == 204
+    assert response.headers["access-control-allow-headers"] == "authorization, content-type"
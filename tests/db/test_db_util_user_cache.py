@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("supabase")
+pytest.importorskip("bcrypt")
+
+from cachetools import TTLCache
+
+from db.db_util import SupabaseManager
+
+
+class _FakeQuery:
+    def __init__(self, rows):
+        self._rows = rows
+        self._op = "select"
+        self._payload = None
+        self._filters = {}
+
+    def select(self, columns):
+        return self
+
+    def update(self, payload):
+        self._op, self._payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self._op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self._filters[column] = value
+        return self
+
+    def execute(self):
+        matched = [
+            row
+            for row in self._rows
+            if all(row.get(column) == value for column, value in self._filters.items())
+        ]
+        if self._op == "update":
+            for row in matched:
+                row.update(self._payload)
+        elif self._op == "delete":
+            for row in matched:
+                self._rows.remove(row)
+            return SimpleNamespace(data=[], count=len(matched))
+        return SimpleNamespace(data=[dict(row) for row in matched], count=None)
+
+
+class _FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def table(self, name):
+        self.queries += 1
+        return _FakeQuery(self.rows)
+
+
+def _make_manager():
+    manager = SupabaseManager.__new__(SupabaseManager)
+    manager.client = _FakeClient(
+        [{"id": 1, "username": "alice", "email": "alice@example.com", "created_at": "now"}]
+    )
+    manager._user_cache = TTLCache(maxsize=16, ttl=60)
+    return manager
+
+
+def test_get_user_by_id_is_cached():
+    manager = _make_manager()
+
+    asyncio.run(manager.get_user_by_id(1))
+    asyncio.run(manager.get_user_by_id(1))
+
+    assert manager.client.queries == 1
+
+
+def test_update_user_refreshes_cached_user():
+    manager = _make_manager()
+    asyncio.run(manager.get_user_by_id(1))
+
+    asyncio.run(manager.update_user(1, username="alicia"))
+
+    assert asyncio.run(manager.get_user_by_id(1))["username"] == "alicia"
+    assert asyncio.run(manager.get_user_by_username("alice")) is None
+    assert list(manager._user_cache) == [1]
+
+
+def test_delete_user_invalidates_cached_user():
+    manager = _make_manager()
+    asyncio.run(manager.get_user_by_id(1))
+
+    assert asyncio.run(manager.delete_user(1)) is True
+
+    assert asyncio.run(manager.get_user_by_id(1)) is None
+    assert len(manager._user_cache) == 0
@@ -1,19 +1,26 @@
 import asyncio
+import multiprocessing
 import os
 import random
 import shutil
 import time
-from typing import List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import replace
+from functools import cache
+from textwrap import dedent
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import numpy as np
-import torch
 from langchain_core.documents import Document
 
-from src.retriever.vector_store import AsyncVectorStore
+if TYPE_CHECKING:
+    from src.retriever.vector_store import AsyncVectorStore
 
 
 def set_deterministic_seeds():
     """Set all random seeds for reproducible results."""
+    import torch
+
     random.seed(42)
 
     np.random.seed(42)
@@ -31,24 +38,29 @@ def set_deterministic_seeds():
 
 def cleanup_test_data():
     """Clean up test data directories."""
-    test_dirs = ["./test_chroma_db"]
+    test_dirs = ["./test_chroma_db", "./test_chroma_db_performance"]
+    existing_dirs = [dir_path for dir_path in test_dirs if os.path.exists(dir_path)]
+    if not existing_dirs:
+        return
 
-    for dir_path in test_dirs:
-        if os.path.exists(dir_path):
-            print(f"🧹 Cleaning up {dir_path}")
-            shutil.rmtree(dir_path)
+    for dir_path in existing_dirs:
+        print(f"🧹 Cleaning up {dir_path}")
+    with ThreadPoolExecutor(max_workers=len(existing_dirs)) as executor:
+        list(executor.map(lambda path: shutil.rmtree(path, ignore_errors=True), existing_dirs))
 
 
-def create_test_documents() -> List[Document]:
-    """Create sample documents for testing with consistent content."""
-    documents = [
+@cache
+def _test_documents() -> Tuple[Document, ...]:
+    return (
         Document(
-            page_content="""
+            page_content=dedent(
+                """
             Artificial Intelligence (AI) is a branch of computer science that aims to create intelligent machines.
             These machines can perform tasks that typically require human intelligence, such as visual perception,
             speech recognition, decision-making, and language translation. AI has applications in various fields
             including healthcare, finance, transportation, and entertainment.
-            """,
+                """
+            ).strip(),
             metadata={
                 "source": "ai_intro.txt",
                 "category": "technology",
@@ -57,12 +69,14 @@ def create_test_documents() -> List[Document]:
             },
         ),
         Document(
-            page_content="""
+            page_content=dedent(
+                """
             Machine Learning is a subset of AI that enables computers to learn and improve from experience
             without being explicitly programmed. It uses algorithms to identify patterns in data and make
             predictions or decisions. Common types include supervised learning, unsupervised learning, and
             reinforcement learning. Popular frameworks include TensorFlow, PyTorch, and scikit-learn.
-            """,
+                """
+            ).strip(),
             metadata={
                 "source": "ml_basics.txt",
                 "category": "technology",
@@ -71,12 +85,14 @@ def create_test_documents() -> List[Document]:
             },
         ),
         Document(
-            page_content="""
+            page_content=dedent(
+                """
             Deep Learning is a subset of machine learning that uses neural networks with multiple layers
             to model and understand complex patterns. It has revolutionized fields like computer vision,
             natural language processing, and speech recognition. Deep learning models can automatically
             learn hierarchical representations of data, making them powerful for complex tasks.
-            """,
+                """
+            ).strip(),
             metadata={
                 "source": "deep_learning.txt",
                 "category": "technology",
@@ -85,12 +101,14 @@ def create_test_documents() -> List[Document]:
             },
         ),
         Document(
-            page_content="""
+            page_content=dedent(
+                """
             Natural Language Processing (NLP) is a field of AI that focuses on the interaction between
             computers and human language. It enables machines to understand, interpret, and generate
             human language. Applications include chatbots, language translation, sentiment analysis,
             and text summarization. Modern NLP uses transformer models like BERT and GPT.
-            """,
+                """
+            ).strip(),
             metadata={
                 "source": "nlp_intro.txt",
                 "category": "technology",
@@ -99,12 +117,14 @@ def create_test_documents() -> List[Document]:
             },
         ),
         Document(
-            page_content="""
+            page_content=dedent(
+                """
             Computer Vision is a field of AI that enables computers to interpret and understand visual
             information from the world. It involves techniques for acquiring, processing, analyzing,
             and understanding digital images. Applications include facial recognition, autonomous vehicles,
             medical imaging, and augmented reality. Deep learning has significantly advanced this field.
-            """,
+                """
+            ).strip(),
             metadata={
                 "source": "computer_vision.txt",
                 "category": "technology",
@@ -112,20 +132,24 @@ def create_test_documents() -> List[Document]:
                 "test_id": "doc_005",
             },
         ),
-    ]
-    return documents
+    )
 
 
-async def test_document_addition(vector_store: AsyncVectorStore) -> dict:
+def create_test_documents() -> List[Document]:
+    """Create sample documents for testing with consistent content."""
+    return list(_test_documents())
+
+
+async def test_document_addition(vector_store: "AsyncVectorStore") -> dict:
     """Test adding documents to the vector store with consistent results."""
     print("🧪 Testing document addition...")
 
     documents = create_test_documents()
-    start_time = time.time()
+    start_time = time.perf_counter()
 
     await vector_store.add_documents(documents)
 
-    end_time = time.time()
+    end_time = time.perf_counter()
     duration = end_time - start_time
 
     print(f"✅ Added {len(documents)} documents in {duration:.2f} seconds")
@@ -136,7 +160,7 @@ async def test_document_addition(vector_store: AsyncVectorStore) -> dict:
     }
 
 
-async def test_search_functionality(vector_store: AsyncVectorStore) -> dict:
+async def test_search_functionality(vector_store: "AsyncVectorStore") -> dict:
     """Test search functionality with consistent queries and expected results."""
     print("\n🔍 Testing search functionality...")
 
@@ -150,16 +174,21 @@ async def test_search_functionality(vector_store: AsyncVectorStore) -> dict:
 
     results_summary = {}
 
-    for query in test_queries:
-        print(f"\nQuery: '{query}'")
-        start_time = time.time()
+    # One batched call embeds every query together and runs a single collection query
+    start_time = time.perf_counter()
+    batch_results = await vector_store.search_many(test_queries, top_k=3)
+    end_time = time.perf_counter()
+    batch_duration = end_time - start_time
+    # Per-query latency is amortized over the batch, not measured per call
+    amortized_duration = batch_duration / len(test_queries)
 
-        results = await vector_store.search(query, top_k=3)
-
-        end_time = time.time()
-        duration = end_time - start_time
+    print(
+        f"Searched {len(test_queries)} queries in {batch_duration:.3f} seconds "
+        f"({amortized_duration:.3f} seconds per query, amortized)"
+    )
 
-        print(f"Search completed in {duration:.3f} seconds")
+    for query, results in zip(test_queries, batch_results):
+        print(f"\nQuery: '{query}'")
 
         query_results = []
         for i, (doc, score) in enumerate(results, 1):
@@ -173,26 +202,34 @@ async def test_search_functionality(vector_store: AsyncVectorStore) -> dict:
             print(f"  {i}. Score: {score:.3f} | Title: {result_info['title']}")
             print(f"     Content: {doc.page_content[:100]}...")
 
-        results_summary[query] = {"duration": duration, "results": query_results}
+        results_summary[query] = {
+            "amortized_duration": amortized_duration,
+            "batch_duration": batch_duration,
+            "results": query_results,
+        }
 
     return results_summary
 
 
-async def test_batch_processing(vector_store: AsyncVectorStore) -> dict:
+_BATCH_DOCUMENT_TEMPLATE = dedent(
+    """
+            This is test document number {doc_number}. It contains information about various topics
+            including technology, science, and innovation. Document {doc_number} discusses important
+            concepts and provides valuable insights for testing purposes. The content includes
+            multiple paragraphs with different types of information to test chunking and
+            retrieval capabilities of the vector store system.
+            """
+).strip()
+
+
+async def test_batch_processing(vector_store: "AsyncVectorStore") -> dict:
     """Test batch processing with consistent document sets."""
     print("\n📦 Testing batch processing...")
 
     # Create consistent batch of documents
-    large_documents = []
-    for i in range(20):
-        doc = Document(
-            page_content=f"""
-            This is test document number {i + 1}. It contains information about various topics
-            including technology, science, and innovation. Document {i + 1} discusses important
-            concepts and provides valuable insights for testing purposes. The content includes
-            multiple paragraphs with different types of information to test chunking and
-            retrieval capabilities of the vector store system.
-            """,
+    large_documents = [
+        Document(
+            page_content=_BATCH_DOCUMENT_TEMPLATE.format(doc_number=i + 1),
             metadata={
                 "source": f"test_doc_{i + 1:03d}.txt",
                 "batch_id": "test_batch_001",
@@ -200,11 +237,12 @@ async def test_batch_processing(vector_store: AsyncVectorStore) -> dict:
                 "test_id": f"batch_doc_{i + 1:03d}",
             },
         )
-        large_documents.append(doc)
+        for i in range(20)
+    ]
 
-    start_time = time.time()
+    start_time = time.perf_counter()
     await vector_store.add_documents(large_documents)
-    end_time = time.time()
+    end_time = time.perf_counter()
 
     duration = end_time - start_time
     print(
@@ -218,93 +256,150 @@ async def test_batch_processing(vector_store: AsyncVectorStore) -> dict:
     }
 
 
-async def test_performance(vector_store: AsyncVectorStore) -> dict:
-    """Test performance with consistent batch sizes and measurements."""
+_PERFORMANCE_DOCUMENT_TEMPLATE = dedent(
+    """
+        Performance test document {doc_number:03d} with batch size {batch_size}. 
+        This is a much longer document that will actually be processed by the text splitter.
+        It contains multiple paragraphs of content to ensure that the chunking process
+        creates multiple chunks from each document. This allows us to properly test
+        the batching behavior of the vector store operations.
+        
+        The document continues with additional content to make it long enough for chunking.
+        We need enough text so that when the RecursiveCharacterTextSplitter processes it,
+        it creates multiple chunks instead of just one. This is important for testing
+        the batch processing functionality of our vector store implementation.
+        
+        More content follows to ensure proper chunking. The chunk size is set to 500 characters,
+        so we need documents that are significantly longer than that to see multiple chunks.
+        This will help us understand how the batching affects performance when there are
+        actually multiple chunks being processed in parallel.
+        
+        Additional paragraphs are added to make this document long enough. The goal is to
+        have each document split into at least 3-4 chunks, so we can see how different
+        batch sizes affect the processing time and throughput of the vector store operations.
+        """
+).strip()
+
+
+def create_performance_documents(batch_size: int) -> List[Document]:
+    """Create long documents for a performance run that split into several chunks."""
+    # Create longer test documents that will be chunked
+    return [
+        Document(
+            page_content=_PERFORMANCE_DOCUMENT_TEMPLATE.format(
+                doc_number=i + 1, batch_size=batch_size
+            ),
+            metadata={
+                "batch_size": batch_size,
+                "doc_id": i,
+                "test_id": f"perf_doc_{batch_size}_{i + 1:03d}",
+            },
+        )
+        for i in range(10)
+    ]
+
+
+async def run_performance_case(vector_store: "AsyncVectorStore", batch_size: int) -> dict:
+    """Time adding the performance documents to a store configured for batch_size."""
+    test_docs = create_performance_documents(batch_size)
+    print(f"  Created {len(test_docs)} long documents for batch_size {batch_size}")
+
+    start_time = time.perf_counter()
+    await vector_store.add_documents(test_docs)
+    end_time = time.perf_counter()
+
+    duration = end_time - start_time
+    rate = len(test_docs) / duration if duration > 0 else 0
+
+    print(f"  batch_size {batch_size} time: {duration:.2f} seconds")
+    print(f"  batch_size {batch_size} rate: {rate:.1f} docs/second")
+
+    return {
+        "duration": duration,
+        "rate": rate,
+        "documents": len(test_docs),
+    }
+
+
+async def test_performance(
+    vector_store: "AsyncVectorStore",
+    parallel: bool = False,
+    split_pool: Optional[ProcessPoolExecutor] = None,
+    max_in_flight: Optional[int] = None,
+) -> dict:
+    """Test performance with consistent batch sizes and measurements.
+
+    With parallel=True every batch size gets its own collection and the sweep runs
+    concurrently, at most max_in_flight batch sizes at a time; this is faster, but
+    the runs then compete for the embedder.
+    """
+    from src.retriever.vector_store import AsyncVectorStore
+
     print("\n⚡ Testing performance...")
 
     # Test with different batch sizes
     batch_sizes = [4, 8, 16, 32, 64, 128]
-    performance_results = {}
-
-    for batch_size in batch_sizes:
-        print(f"\nTesting with batch_size: {batch_size}")
 
-        # Create a NEW vector store instance with this batch size
-        test_config = {
-            "collection_name": f"test_collection_batch_{batch_size}",
-            "persist_directory": f"./test_chroma_db_batch_{batch_size}",
+    test_config = {
+        "collection_name": "test_collection_performance",
+        "persist_directory": "./test_chroma_db_performance",
+        "chunk_size": 500,
+        "chunk_overlap": 50,
+        "batch_size": batch_sizes[0],
+        "max_workers": 2,
+        "top_k": 3,
+        "recursive_character_text_splitter": {
             "chunk_size": 500,
             "chunk_overlap": 50,
-            "batch_size": batch_size,  # This is the key difference
-            "max_workers": 2,
-            "top_k": 3,
-            "recursive_character_text_splitter": {
-                "chunk_size": 500,
-                "chunk_overlap": 50,
-                "length_function": len,
-                "separators": ["\n\n", "\n", " ", ""],
-            },
-        }
+            "length_function": len,
+            "separators": ["\n\n", "\n", " ", ""],
+        },
+    }
 
-        test_vector_store = AsyncVectorStore(test_config)
-
-        # Create longer test documents that will be chunked
-        test_docs = []
-        for i in range(10):
-            long_content = f"""
-            Performance test document {i + 1:03d} with batch size {batch_size}. 
-            This is a much longer document that will actually be processed by the text splitter.
-            It contains multiple paragraphs of content to ensure that the chunking process
-            creates multiple chunks from each document. This allows us to properly test
-            the batching behavior of the vector store operations.
-            
-            The document continues with additional content to make it long enough for chunking.
-            We need enough text so that when the RecursiveCharacterTextSplitter processes it,
-            it creates multiple chunks instead of just one. This is important for testing
-            the batch processing functionality of our vector store implementation.
-            
-            More content follows to ensure proper chunking. The chunk size is set to 500 characters,
-            so we need documents that are significantly longer than that to see multiple chunks.
-            This will help us understand how the batching affects performance when there are
-            actually multiple chunks being processed in parallel.
-            
-            Additional paragraphs are added to make this document long enough. The goal is to
-            have each document split into at least 3-4 chunks, so we can see how different
-            batch sizes affect the processing time and throughput of the vector store operations.
-            """.strip()
-
-            doc = Document(
-                page_content=long_content,
-                metadata={
+    if parallel:
+        stores = {
+            batch_size: AsyncVectorStore(
+                {
+                    **test_config,
+                    "collection_name": f"test_collection_batch_{batch_size}",
                     "batch_size": batch_size,
-                    "doc_id": i,
-                    "test_id": f"perf_doc_{batch_size}_{i + 1:03d}",
                 },
+                split_pool=split_pool,
             )
-            test_docs.append(doc)
+            for batch_size in batch_sizes
+        }
+        for store in stores.values():
+            store.reset()
 
-        print(f"  Created {len(test_docs)} long documents for testing")
+        semaphore = asyncio.Semaphore(max_in_flight or len(batch_sizes))
 
-        start_time = time.time()
-        await test_vector_store.add_documents(test_docs)
-        end_time = time.time()
+        async def _run(batch_size: int) -> dict:
+            async with semaphore:
+                return await run_performance_case(stores[batch_size], batch_size)
 
-        duration = end_time - start_time
-        rate = len(test_docs) / duration if duration > 0 else 0
+        print(f"\nTesting batch sizes {batch_sizes} concurrently")
+        results = await asyncio.gather(*(_run(batch_size) for batch_size in batch_sizes))
+        for store in stores.values():
+            store.close()
+        return dict(zip(batch_sizes, results))
 
-        print(f"  Time: {duration:.2f} seconds")
-        print(f"  Rate: {rate:.1f} docs/second")
+    # Share one store (and its embedder) across batch sizes so the timings
+    # measure batching rather than model and collection start-up
+    test_vector_store = AsyncVectorStore(test_config, split_pool=split_pool)
+    performance_results = {}
 
-        performance_results[batch_size] = {
-            "duration": duration,
-            "rate": rate,
-            "documents": len(test_docs),
-        }
+    for batch_size in batch_sizes:
+        print(f"\nTesting with batch_size: {batch_size}")
 
-        # Clean up the test directory
-        test_dir = f"./test_chroma_db_batch_{batch_size}"
-        if os.path.exists(test_dir):
-            shutil.rmtree(test_dir)
+        # Start each batch size from an empty collection
+        test_vector_store.settings = replace(test_vector_store.settings, batch_size=batch_size)
+        test_vector_store.reset()
+
+        performance_results[batch_size] = await run_performance_case(
+            test_vector_store, batch_size
+        )
+
+    test_vector_store.close()
 
     return performance_results
 
@@ -347,6 +442,10 @@ def verify_consistency(results: dict, expected_results: dict = None) -> bool:
 
 async def main():
     """Main test function with consistency controls."""
+    # Imported here so importing this module does not load torch, Chroma and the
+    # embedder stack
+    from src.retriever.vector_store import AsyncVectorStore
+
     print("🚀 Starting Consistent AsyncVectorStore Test Driver")
     print("=" * 60)
 
@@ -374,18 +473,35 @@ async def main():
         },
     }
 
-    vector_store = AsyncVectorStore(config)
+    # Keep one thread pool and one split process pool alive for the whole run so
+    # worker start-up is not repeated (or timed) for every store
+    executor = ThreadPoolExecutor(max_workers=2)
+    asyncio.get_running_loop().set_default_executor(executor)
+    split_pool = ProcessPoolExecutor(
+        max_workers=2, mp_context=multiprocessing.get_context("spawn")
+    )
+
+    vector_store = AsyncVectorStore(config, split_pool=split_pool)
 
     all_results = {}
 
     try:
+        # Run one throwaway embedding first so first-call start-up cost is not
+        # counted in the first timed test
+        await asyncio.to_thread(vector_store.warm_up)
+
         # Run tests and collect results
         all_results["document_addition"] = await test_document_addition(vector_store)
         all_results["search_functionality"] = await test_search_functionality(
             vector_store
         )
         all_results["batch_processing"] = await test_batch_processing(vector_store)
-        all_results["performance"] = await test_performance(vector_store)
+        all_results["performance"] = await test_performance(
+            vector_store,
+            parallel=os.getenv("PERF_SWEEP_PARALLEL") == "1",
+            split_pool=split_pool,
+            max_in_flight=int(os.getenv("PERF_SWEEP_MAX_IN_FLIGHT", "0")) or None,
+        )
 
         # Verify consistency
         is_consistent = verify_consistency(all_results)
@@ -402,9 +518,17 @@ async def main():
         traceback.print_exc()
 
     finally:
+        vector_store.close()
+        split_pool.shutdown(wait=True)
+        executor.shutdown(wait=True)
         cleanup_test_data()
         print("\n🧹 Cleanup completed")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cachetools")
+
+from retriever.query_cache import QueryCache, SemanticCache, normalize_embedding
+
+
+def _unit(*values):
+    return normalize_embedding(list(values))
+
+
+def test_query_cache_hit_and_miss_stats():
+    cache = QueryCache(max_size=4, ttl_seconds=60)
+    cache.set("a", [1])
+
+    assert cache.get("a") == [1]
+    assert cache.get("b") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "max_size": 4}
+
+
+def test_query_cache_evicts_oldest_entry_when_full():
+    cache = QueryCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get("c") == 3
+
+
+def test_query_cache_entries_expire_after_ttl():
+    cache = QueryCache(max_size=2, ttl_seconds=0.05)
+    cache.set("a", 1)
+
+    time.sleep(0.1)
+
+    assert cache.get("a") is None
+
+
+def test_semantic_cache_hits_above_threshold_and_misses_below():
+    cache = SemanticCache(capacity=4, threshold=0.95)
+    cache.set(_unit(1.0, 0.0), "x-axis")
+
+    assert cache.get(_unit(1.0, 0.1)) == "x-axis"
+    assert cache.get(_unit(1.0, 1.0)) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_semantic_cache_overwrites_oldest_entry_first():
+    cache = SemanticCache(capacity=2, threshold=0.99)
+    cache.set(_unit(1.0, 0.0, 0.0), "first")
+    cache.set(_unit(0.0, 1.0, 0.0), "second")
+    cache.set(_unit(0.0, 0.0, 1.0), "third")
+
+    assert cache.get(_unit(1.0, 0.0, 0.0)) is None
+    assert cache.get(_unit(0.0, 1.0, 0.0)) == "second"
+    assert cache.get(_unit(0.0, 0.0, 1.0)) == "third"
+    assert cache.stats()["size"] == 2
+
+
+def test_semantic_cache_clear_drops_entries():
+    cache = SemanticCache(capacity=2, threshold=0.9)
+    cache.set(_unit(1.0, 0.0), "x-axis")
+    cache.clear()
+
+    assert cache.get(_unit(1.0, 0.0)) is None
+    assert cache.stats()["size"] == 0
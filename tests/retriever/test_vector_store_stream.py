@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("langchain_huggingface")
+pytest.importorskip("langchain_text_splitters")
+pytest.importorskip("numpy")
+
+from langchain_core.documents import Document
+
+from retriever.query_cache import QueryCache
+from retriever.vector_store import AsyncVectorStore, VectorStoreSettings
+
+
+def _make_store(stream_batch_size=2, max_concurrent_batches=2):
+    store = AsyncVectorStore.__new__(AsyncVectorStore)
+    store.settings = VectorStoreSettings(
+        collection_name="test",
+        persist_directory="unused",
+        batch_size=8,
+        max_concurrent_batches=max_concurrent_batches,
+        split_shard_size=8,
+        split_workers=1,
+        embed_chunk_size=8,
+        stream_batch_size=stream_batch_size,
+        top_k=3,
+        chunk_size=100,
+        chunk_overlap=0,
+        length_function=len,
+        separators=("\n",),
+    )
+    store.query_cache = QueryCache(max_size=8, ttl_seconds=60)
+    store.semantic_cache = None
+    return store
+
+
+async def _stream(contents, error=None):
+    for content in contents:
+        yield Document(page_content=content)
+        await asyncio.sleep(0)
+    if error is not None:
+        raise error
+
+
+def test_add_documents_from_stream_dedupes_within_and_across_batches():
+    store = _make_store(stream_batch_size=2)
+    batches = []
+
+    async def add_new_documents(documents):
+        batches.append([doc.page_content for doc in documents])
+        return len(documents)
+
+    store._add_new_documents = add_new_documents
+
+    added = asyncio.run(
+        store.add_documents_from_stream(_stream(["a", "a", "b", "c", "b", "a", "d"]))
+    )
+
+    assert added == 4
+    assert batches == [["a", "b"], ["c", "d"]]
+
+
+def test_add_documents_from_stream_cancels_batches_when_stream_fails():
+    store = _make_store(stream_batch_size=1)
+    cancelled = []
+
+    async def add_new_documents(documents):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(documents[0].page_content)
+            raise
+        return len(documents)
+
+    store._add_new_documents = add_new_documents
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            store.add_documents_from_stream(_stream(["a", "b"], error=RuntimeError("boom")))
+        )
+
+    assert sorted(cancelled) == ["a", "b"]
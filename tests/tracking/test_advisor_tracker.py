@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("orjson")
+
+from tracking.advisor_tracker import AdvisorTracker
+
+
+def test_log_portfolio_context_averages_page_content_lengths(monkeypatch):
+    tracker = AdvisorTracker.__new__(AdvisorTracker)
+    tracker.client = object()
+    logged = {}
+    monkeypatch.setattr(tracker, "_log_batch", lambda **kwargs: logged.update(kwargs))
+    monkeypatch.setattr(tracker, "_log_json_artifact", lambda *args: None)
+    monkeypatch.setattr(tracker, "_log_text", lambda *args: None)
+
+    relevant_documents = [
+        (SimpleNamespace(page_content="a" * 10), 0.9),
+        (SimpleNamespace(page_content="b" * 30), 0.8),
+    ]
+    tracker.log_portfolio_context(
+        user_id=1,
+        holdings=[{"stock": "AAPL"}],
+        relevant_documents=relevant_documents,
+        processing_time=0.5,
+    )
+
+    assert logged["metrics"]["avg_document_length"] == 20.0
+    assert logged["metrics"]["relevant_documents_count"] == 2
+
+
+def test_log_portfolio_context_without_documents_reports_zero_length(monkeypatch):
+    tracker = AdvisorTracker.__new__(AdvisorTracker)
+    tracker.client = object()
+    logged = {}
+    monkeypatch.setattr(tracker, "_log_batch", lambda **kwargs: logged.update(kwargs))
+    monkeypatch.setattr(tracker, "_log_json_artifact", lambda *args: None)
+    monkeypatch.setattr(tracker, "_log_text", lambda *args: None)
+
+    tracker.log_portfolio_context(
+        user_id=1, holdings=[], relevant_documents=[], processing_time=0.1
+    )
+
+    assert logged["metrics"]["avg_document_length"] == 0.0
+    assert logged["metrics"]["relevant_documents_count"] == 0
@@ -0,0 +1,18 @@
+import threading
+
+from tracking.async_logger import _AsyncMlflowWorker
+
+
+def test_flush_times_out_on_stuck_call():
+    worker = _AsyncMlflowWorker()
+    release = threading.Event()
+    worker.submit(release.wait)
+
+    assert worker.flush(timeout=0.05) is False
+
+    release.set()
+    assert worker.flush(timeout=5) is True
+
+
+def test_flush_without_started_worker_returns_immediately():
+    assert _AsyncMlflowWorker().flush(timeout=0) is True
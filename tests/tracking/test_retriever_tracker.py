@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("orjson")
+
+from tracking.retriever_tracker import RetrieverTracker
+
+
+def _make_tracker(monkeypatch, logged):
+    tracker = RetrieverTracker.__new__(RetrieverTracker)
+    tracker.client = object()
+    monkeypatch.setattr(tracker, "_log_batch", lambda **kwargs: logged.update(kwargs))
+    return tracker
+
+
+def test_log_document_processing_metrics_summarizes_chunk_sizes(monkeypatch):
+    logged = {}
+    tracker = _make_tracker(monkeypatch, logged)
+
+    tracker.log_document_processing_metrics(
+        total_documents=2, total_chunks=3, processing_time=0.5, chunk_sizes=[10, 20, 60]
+    )
+
+    metrics = logged["metrics"]
+    assert metrics["avg_chunk_size"] == 30.0
+    assert metrics["min_chunk_size"] == 10
+    assert metrics["max_chunk_size"] == 60
+    assert metrics["chunk_size_2"] == 60
+
+
+def test_log_document_processing_metrics_handles_no_chunks(monkeypatch):
+    logged = {}
+    tracker = _make_tracker(monkeypatch, logged)
+
+    tracker.log_document_processing_metrics(
+        total_documents=0, total_chunks=0, processing_time=0.0, chunk_sizes=[]
+    )
+
+    assert logged["metrics"]["avg_chunk_size"] == 0
+    assert logged["metrics"]["max_chunk_size"] == 0